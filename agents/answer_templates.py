@@ -0,0 +1,386 @@
+"""
+Deterministic answers for common result shapes, without an LLM round trip.
+
+The executed SQL's projection (aggregates, plain columns, aliases), its WHERE,
+GROUP BY and ORDER BY ... LIMIT clauses and the typed rows of the result are
+enough to phrase answers for single scalars, counts, min/max/avg/sum, a single
+row, grouped aggregates and short ranked lists. Anything else (errors, joins,
+groups that are not selected, long or wide results, unlabelled expressions)
+returns None and the caller falls back to the LLM.
+"""
+import ast
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, TypedDict
+
+from agents.example_store import sql_text
+from db.sql_parsing import mask, split_alias, split_clauses, split_order_term, split_top_level
+
+_AGGREGATE = re.compile(r"^(COUNT|SUM|TOTAL|AVG|MIN|MAX)\s*\(\s*(DISTINCT\s+)?(.*?)\s*\)$", re.IGNORECASE | re.DOTALL)
+_ROUND = re.compile(r"^ROUND\s*\(\s*(.*?)\s*(?:,\s*\d+\s*)?\)$", re.IGNORECASE | re.DOTALL)
+_PLAIN_COLUMN = re.compile(r"^(?:[A-Za-z_]\w*\s*\.\s*)?[\"`\[]?([A-Za-z_]\w*)[\"`\]]?$")
+_SIMPLE_PREDICATE = re.compile(
+    r"^(?:[A-Za-z_]\w*\s*\.\s*)?[\"`\[]?([A-Za-z_]\w*)[\"`\]]?\s*(=|==|!=|<>|>=|<=|>|<)\s*('(?:[^']|'')*'|-?\d+(?:\.\d+)?)$"
+)
+_YES_NO_QUESTION = re.compile(r"^\s*(is|are|was|were|does|do|did|has|have|can|any)\b", re.IGNORECASE)
+# "Are there any employees in HR?": the answer is yes exactly when matching rows exist
+_EXISTENCE_QUESTION = re.compile(r"^\s*(?:(?:is|are|was|were)\s+there\b|any\b)", re.IGNORECASE)
+# Comparisons, quantifiers and negations change what "yes" means, so the LLM answers those
+_QUALIFIED_QUESTION = re.compile(
+    r"\b(more|fewer|less|greater|than|exactly|only|at least|at most|all|every|each|no|not|none|never)\b|n't\b",
+    re.IGNORECASE,
+)
+
+AGGREGATE_WORDS = {"AVG": "average", "SUM": "total", "TOTAL": "total", "MIN": "minimum", "MAX": "maximum"}
+OPERATOR_WORDS = {
+    "=": "is", "==": "is", "!=": "is not", "<>": "is not",
+    ">": "is greater than", "<": "is less than", ">=": "is at least", "<=": "is at most",
+}
+
+
+class ProjectedColumn(TypedDict):
+    label: str
+    # COUNT, SUM, AVG, ... or None for a plain column / aliased expression
+    aggregate: Optional[str]
+    column: Optional[str]
+    distinct: bool
+
+
+def _humanize(name: str) -> str:
+    return name.strip('"`[]').replace("_", " ")
+
+
+def format_value(value: Any) -> str:
+    """Human-friendly rendering of a result value (thousands separators, at most two decimals)."""
+    if value is None:
+        return "none"
+    if isinstance(value, float):
+        if value.is_integer():
+            value = int(value)
+        else:
+            text = f"{value:,.2f}" if abs(value) >= 10000 else f"{value:.2f}"
+            return text.rstrip("0").rstrip(".")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}" if abs(value) >= 10000 else str(value)
+    return str(value)
+
+
+def _join(items: Sequence[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return f"{', '.join(items[:-1])} and {items[-1]}"
+
+
+def parse_result_rows(sql_result: Any) -> Optional[List[Tuple[Any, ...]]]:
+    """Typed rows of an ``exec_sql`` result, or None for errors and unparseable output."""
+    if not isinstance(sql_result, dict) or "result" not in sql_result:
+        return None
+    raw = sql_result["result"]
+    if isinstance(raw, str):
+        if not raw.strip():
+            return []
+        if raw.startswith("Error:"):
+            return None
+        try:
+            raw = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            # e.g. datetime or Decimal reprs
+            return None
+    if not isinstance(raw, list) or not all(isinstance(row, (tuple, list)) for row in raw):
+        return None
+    return [tuple(row) for row in raw]
+
+
+def _single_call(expression: str) -> bool:
+    """True if ``expression`` is one function call, e.g. not ``COUNT(*) - COUNT(salary)``."""
+    return re.fullmatch(r"\s*[A-Za-z_]\w*\s*\(\s*\)\s*", mask(expression)) is not None
+
+
+def _has_offset(clauses: Dict[str, str]) -> bool:
+    """``LIMIT n OFFSET m`` or ``LIMIT m, n``: the rows are not the top of the ordering."""
+    return re.search(r"\bOFFSET\b|,", mask(clauses.get("LIMIT", "")), re.IGNORECASE) is not None
+
+
+def _projected_column(item: str, table: Optional[str]) -> Optional[ProjectedColumn]:
+    expression, alias = split_alias(item)
+    rounded = _ROUND.match(expression) if _single_call(expression) else None
+    if rounded:
+        expression = rounded.group(1)
+    aggregate = _AGGREGATE.match(expression) if _single_call(expression) else None
+    plain = _PLAIN_COLUMN.match(expression)
+    if aggregate:
+        function, distinct, argument = aggregate.group(1).upper(), bool(aggregate.group(2)), aggregate.group(3)
+        argument_column = _PLAIN_COLUMN.match(argument)
+        column = argument_column.group(1) if argument_column else None
+        if alias:
+            label = _humanize(alias)
+        elif function == "COUNT":
+            if distinct and column:
+                label = f"number of distinct {_humanize(column)} values"
+            else:
+                label = f"number of {table or 'rows'}"
+        elif column:
+            label = f"{AGGREGATE_WORDS[function]} {_humanize(column)}"
+        else:
+            return None
+        return {"label": label, "aggregate": function, "column": column, "distinct": distinct}
+    if plain:
+        return {"label": _humanize(alias or plain.group(1)), "aggregate": None, "column": plain.group(1), "distinct": False}
+    if alias:
+        return {"label": _humanize(alias), "aggregate": None, "column": None, "distinct": False}
+    # An unlabelled expression cannot be described reliably
+    return None
+
+
+def _where_phrase(where: str, table: Optional[str], preposition: Optional[str]) -> Optional[str]:
+    """
+    " for employees whose department is Sales" (or just " whose ..." without a
+    preposition) for simple conjunctive filters; None if the filter is too complex.
+    """
+    if not where:
+        return ""
+    if table is None:
+        return None
+    masked = mask(where)
+    if re.search(r"\b(OR|NOT|BETWEEN|LIKE|GLOB|IN|EXISTS|SELECT)\b|\(", masked, re.IGNORECASE):
+        return None
+    conditions = []
+    for match in re.finditer(r"(?:^|\bAND\b)(.*?)(?=\bAND\b|$)", masked, re.IGNORECASE | re.DOTALL):
+        conjunct = where[match.start(1):match.end(1)].strip()
+        predicate = _SIMPLE_PREDICATE.match(conjunct)
+        if not predicate:
+            return None
+        column, operator, value = predicate.groups()
+        if value.startswith("'"):
+            value = value[1:-1].replace("''", "'")
+        else:
+            value = format_value(ast.literal_eval(value))
+        conditions.append(f"{_humanize(column)} {OPERATOR_WORDS[operator]} {value}")
+    subject = f" {preposition} {table}" if preposition else ""
+    return f"{subject} whose {' and '.join(conditions)}"
+
+
+def _count_noun(noun: str, count: int) -> str:
+    # Table names are usually plural ("employees"); "1 employees" reads badly
+    if count == 1 and noun.endswith("s") and not noun.endswith("ss"):
+        return noun[:-1]
+    return noun
+
+
+def _groups_projected(group_by: str, select_items: List[str]) -> bool:
+    """True if every GROUP BY term (expression, alias or position) is one of the selected items."""
+    projected = set()
+    for item in select_items:
+        expression, alias = split_alias(item)
+        projected.add(re.sub(r"\s+", "", expression).lower())
+        plain = _PLAIN_COLUMN.match(expression)
+        if plain:
+            projected.add(plain.group(1).lower())
+        if alias:
+            projected.add(alias.lower())
+    for term in split_top_level(group_by):
+        if term.isdigit():
+            if not 1 <= int(term) <= len(select_items):
+                return False
+            continue
+        plain = _PLAIN_COLUMN.match(term)
+        if re.sub(r"\s+", "", term).lower() not in projected and not (plain and plain.group(1).lower() in projected):
+            return False
+    return True
+
+
+def _single_table(from_clause: str) -> Optional[str]:
+    match = re.fullmatch(r"[\"`\[]?([A-Za-z_]\w*)[\"`\]]?(?:\s+(?:AS\s+)?[A-Za-z_]\w*)?", from_clause.strip(), re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+class TemplatedAnswerer:
+    """Answers simple results locally and keeps counters of templated vs LLM answers."""
+
+    def __init__(self, max_rows: int = 5, max_columns: int = 3):
+        self.max_rows = max_rows
+        self.max_columns = max_columns
+        self.stats: Dict[str, Any] = {
+            "templated": 0,
+            "llm": 0,
+            "template_seconds": 0.0,
+            "llm_seconds": 0.0,
+        }
+
+    def record_llm_answer(self, seconds: float) -> None:
+        """Account for an answer that had to come from the LLM."""
+        self.stats["llm"] += 1
+        self.stats["llm_seconds"] += seconds
+
+    def answer(self, question: str, executed_sql: Any, sql_result: Any) -> Optional[str]:
+        """A deterministic one-sentence answer, or None if the LLM should answer."""
+        start = time.perf_counter()
+        try:
+            answer = self._answer(question, sql_text(executed_sql), sql_result)
+        except ValueError:
+            answer = None
+        if answer is not None:
+            self.stats["templated"] += 1
+            self.stats["template_seconds"] += time.perf_counter() - start
+        return answer
+
+    def _answer(self, question: str, sql: str, sql_result: Any) -> Optional[str]:
+        rows = parse_result_rows(sql_result)
+        if rows is None or len(rows) > self.max_rows:
+            return None
+        clauses = split_clauses(sql.strip().rstrip(";"))
+        if "HAVING" in clauses or re.search(r"\bSELECT\b", mask(clauses.get("FROM", "")), re.IGNORECASE):
+            return None
+        # Join conditions filter rows like a WHERE clause that the answer would not mention
+        if re.search(r"\bJOIN\b|,", mask(clauses.get("FROM", "")), re.IGNORECASE):
+            return None
+        table = _single_table(clauses.get("FROM", ""))
+        select = re.sub(r"^\s*DISTINCT\s+", "", clauses["SELECT"], flags=re.IGNORECASE)
+        select_items = split_top_level(select)
+        columns = [_projected_column(item, table) for item in select_items]
+        if not columns or None in columns or len(columns) > self.max_columns:
+            return None
+        # Without the group keys the values cannot be told apart
+        if "GROUP BY" in clauses and not _groups_projected(clauses["GROUP BY"], select_items):
+            return None
+        if rows and any(len(row) != len(columns) for row in rows):
+            return None
+        if _has_offset(clauses):
+            return None
+
+        where = clauses.get("WHERE", "")
+        yes_no = bool(_YES_NO_QUESTION.match(question))
+        existence = bool(_EXISTENCE_QUESTION.match(question)) and not _QUALIFIED_QUESTION.search(question)
+        if yes_no and not existence:
+            return None
+        if not rows:
+            subject = table or "records"
+            return f"{'No, n' if existence else 'N'}o matching {subject} were found."
+        if existence and not (len(rows) == 1 and len(columns) == 1 and columns[0]["aggregate"] == "COUNT"):
+            # Only a count (or an empty result) answers an existence question directly
+            return None
+
+        ranking = self._ranking(clauses, columns, table)
+        if len(rows) == 1 and len(columns) == 1:
+            return self._scalar(columns[0], rows[0][0], where, table, existence, ranking)
+        if len(rows) == 1 and ranking is None and "GROUP BY" not in clauses:
+            phrase = _where_phrase(where, table, "for")
+            if phrase is None:
+                return None
+            parts = [f"the {column['label']} is {format_value(value)}" for column, value in zip(columns, rows[0])]
+            sentence = _join(parts)
+            return f"{sentence[0].upper()}{sentence[1:]}{phrase}."
+        return self._listing(clauses, columns, rows, where, table, ranking)
+
+    def _ranking(
+        self, clauses: Dict[str, str], columns: List[ProjectedColumn], table: Optional[str]
+    ) -> Optional[Tuple[str, str]]:
+        """(order label, "highest"/"lowest") for ``ORDER BY x [DESC] LIMIT n`` queries."""
+        if "LIMIT" not in clauses or "ORDER BY" not in clauses or _has_offset(clauses):
+            return None
+        terms = split_top_level(clauses["ORDER BY"])
+        expression, direction = split_order_term(terms[0])
+        label = None
+        for column in columns:
+            if _humanize(expression).lower() in (column["label"].lower(), (column["column"] or "").lower()):
+                label = column["label"]
+        if label is None:
+            plain = _PLAIN_COLUMN.match(expression)
+            aggregate = _projected_column(expression, table)
+            if plain:
+                label = _humanize(plain.group(1))
+            elif aggregate:
+                label = aggregate["label"]
+            else:
+                return None
+        return label, "highest" if "DESC" in direction.upper() else "lowest"
+
+    def _scalar(
+        self,
+        column: ProjectedColumn,
+        value: Any,
+        where: str,
+        table: Optional[str],
+        existence: bool,
+        ranking: Optional[Tuple[str, str]],
+    ) -> Optional[str]:
+        if column["aggregate"] == "COUNT":
+            if column["distinct"]:
+                noun = f"distinct {_humanize(column['column'] or 'value')} values"
+                phrase = _where_phrase(where, table, "among")
+            else:
+                noun = table or "rows"
+                phrase = _where_phrase(where, table, None)
+            if phrase is None or not isinstance(value, int):
+                return None
+            verb = "is" if value == 1 else "are"
+            prefix = ("Yes, t" if value else "No, t") if existence else "T"
+            amount = format_value(value) if value else "no"
+            return f"{prefix}here {verb} {amount} {_count_noun(noun, value)}{phrase}."
+        if value is None:
+            return None
+        if ranking is not None:
+            phrase = _where_phrase(where, table, "among")
+            if phrase is None:
+                return None
+            label, direction = ranking
+            if label == column["label"]:
+                # SELECT salary ... ORDER BY salary DESC LIMIT 1
+                return f"The {direction} {label}{phrase} is {format_value(value)}."
+            return f"{format_value(value)} has the {direction} {label}{phrase}."
+        phrase = _where_phrase(where, table, "for")
+        if phrase is None:
+            return None
+        return f"The {column['label']}{phrase} is {format_value(value)}."
+
+    def _listing(
+        self,
+        clauses: Dict[str, str],
+        columns: List[ProjectedColumn],
+        rows: List[Tuple[Any, ...]],
+        where: str,
+        table: Optional[str],
+        ranking: Optional[Tuple[str, str]],
+    ) -> Optional[str]:
+        phrase = _where_phrase(where, table, "for")
+        if phrase is None:
+            return None
+
+        def describe(row: Tuple[Any, ...]) -> str:
+            details = [f"{column['label']} {format_value(value)}" for column, value in zip(columns[1:], row[1:])]
+            return format_value(row[0]) + (f" ({', '.join(details)})" if details else "")
+
+        if ranking is not None and len(rows) == 1:
+            label, direction = ranking
+            phrase = _where_phrase(where, table, "among")
+            ordered = [format_value(v) for column, v in zip(columns[1:], rows[0][1:]) if column["label"] == label]
+            details = [
+                f"{column['label']} {format_value(v)}"
+                for column, v in zip(columns[1:], rows[0][1:])
+                if column["label"] != label
+            ]
+            sentence = f"{format_value(rows[0][0])} has the {direction} {label}"
+            sentence += f" ({ordered[0]})" if ordered else ""
+            sentence += phrase + (f", with {_join(details)}" if details else "")
+            return sentence + "."
+        if ranking is not None:
+            label, direction = ranking
+            rank = "top" if direction == "highest" else "bottom"
+            items = [describe(row) for row in rows]
+            return f"The {rank} {len(rows)} by {label}{phrase} are {_join(items)}."
+        if "GROUP BY" in clauses and len(columns) == 2 and columns[1]["aggregate"]:
+            items = [f"{format_value(key)} {format_value(value)}" for key, value in rows]
+            return f"The {columns[1]['label']} by {columns[0]['label']}{phrase} is: {_join(items)}."
+        items = [describe(row) for row in rows]
+        return f"The results{phrase} are {_join(items)}."
+
+    def format_report(self) -> str:
+        stats = self.stats
+        total = stats["templated"] + stats["llm"]
+        share = stats["templated"] / total if total else 0.0
+        report = f"Answers: {stats['templated']} of {total} templated locally ({share:.0%})"
+        if stats["llm"] and stats["templated"]:
+            mean_llm = stats["llm_seconds"] / stats["llm"]
+            saved = max(0.0, stats["templated"] * mean_llm - stats["template_seconds"])
+            report += f", saving ~{saved:.1f}s at {mean_llm:.2f}s per LLM answer"
+        return report + "."
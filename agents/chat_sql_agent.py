@@ -1,12 +1,23 @@
+import json
+import pathlib
 import re
-from typing import Any, Dict, List, TypedDict
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, TypedDict
 from langchain_community.utilities import SQLDatabase
+from langchain_core.messages import SystemMessage
 from langgraph.graph import END, StateGraph
 from prompts.sql_prompts import ANSWER_PROMPT
 from langchain import hub
 from typing_extensions import Annotated
 from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
-from agents.visualization_agent import build_visualization_agent, is_visualization_request
+from agents.visualization_agent import build_visualization_agent, generate_chart_json, is_visualization_request
+from agents.answer_templates import TemplatedAnswerer
+from agents.example_store import ExampleStore, sql_text
+from agents.result_history import ResultHistory, is_followup_chart_request, requested_chart_type
+from db.query_log import record_query
+
+if TYPE_CHECKING:
+    from agents.speculation import SpeculativeEngine
 
 query_prompt_template = hub.pull("langchain-ai/sql-query-system-prompt")
 
@@ -18,43 +29,97 @@ class QAState(TypedDict):
     sql_result: List[Any]
     answer: str
     chart_spec: str
+    reused_result: bool
 
 class QueryOutput(TypedDict):
     """Generated SQL query."""
 
     query: Annotated[str, ..., "Syntactically valid SQL query."]
 
-def build_agent(db: SQLDatabase, llm) -> Any:
+# Table info (schema + sample rows) per database; reflecting it on every turn is slow
+_TABLE_INFO_CACHE: Dict[int, str] = {}
+
+def get_table_info_cached(db: SQLDatabase) -> str:
+    """Return ``db.get_table_info()``, computed once per database."""
+    if id(db) not in _TABLE_INFO_CACHE:
+        _TABLE_INFO_CACHE[id(db)] = db.get_table_info()
+    return _TABLE_INFO_CACHE[id(db)]
+
+def build_sql_prompt(db: SQLDatabase, question: str, example_store: Optional[ExampleStore] = None) -> Any:
+    """Build the SQL generation prompt, with the most similar verified examples if a store is given."""
+    prompt = query_prompt_template.invoke(
+    {
+        "dialect": db.dialect,
+        "top_k": 10,
+        "table_info": get_table_info_cached(db),
+        "input": question,
+    })
+    examples = example_store.format_examples(question) if example_store is not None else ""
+    if not examples:
+        return prompt
+    messages = prompt.to_messages()
+    return messages[:-1] + [SystemMessage(content=examples)] + messages[-1:]
+
+def build_agent(
+    db: SQLDatabase,
+    llm,
+    example_store: Optional[ExampleStore] = None,
+    result_history: Optional[ResultHistory] = None,
+    speculation: Optional["SpeculativeEngine"] = None,
+    query_log: Optional[pathlib.Path] = None,
+    answerer: Optional[TemplatedAnswerer] = None,
+) -> Any:
+    # Results retained for this session, for follow-up chart requests
+    result_history = result_history if result_history is not None else ResultHistory()
     structured_llm = llm.with_structured_output(QueryOutput)
 
     def gen_sql(state: QAState) -> QAState:
-
-        prompt = query_prompt_template.invoke(
-        {
-            "dialect": db.dialect,
-            "top_k": 10,
-            "table_info": db.get_table_info(),
-            "input": state["question"],
-        })
+        if speculation is not None:
+            # A predicted follow-up may have been answered while the user was reading
+            sql_query = speculation.take_sql(state["question"])
+            if sql_query is not None:
+                return {**state, "sql_query": sql_query}
+        prompt = build_sql_prompt(db, state["question"], example_store)
         sql_query = structured_llm.invoke(prompt)
         return {**state, "sql_query": sql_query}
 
     def exec_sql(state: QAState) -> QAState:
         executed_sql = state["sql_query"]
+        cached_result = speculation.take_result(executed_sql) if speculation is not None else None
+        if cached_result is not None:
+            return {**state, "sql_result": cached_result, "executed_sql": executed_sql}
         execute_query_tool = QuerySQLDatabaseTool(db=db)
+        start = time.perf_counter()
         try:
             result= {"result": execute_query_tool.invoke(executed_sql)}
         except Exception as exc:
             result = [[f"ERROR: {exc}"]]
+        else:
+            output = str(result["result"])
+            if not output.startswith("Error:"):
+                # Executed statements and their latency feed the index advisor
+                if query_log is not None:
+                    record_query(sql_text(executed_sql), (time.perf_counter() - start) * 1000, query_log)
+                # Non-empty, error-free results become verified few-shot examples
+                if example_store is not None and output:
+                    example_store.add(state["question"], executed_sql)
         return {**state, "sql_result": result, "executed_sql": executed_sql}
 
     def answer_node_fn(state: QAState) -> QAState:
+        if answerer is not None:
+            # Scalars, counts and short lists are phrased locally without an LLM round trip
+            answer = answerer.answer(state["question"], state.get("executed_sql"), state["sql_result"])
+            if answer is not None:
+                return {**state, "answer": answer}
+        start = time.perf_counter()
         prompt = ANSWER_PROMPT.format(
             result=state["sql_result"],
             question=state["question"],
             history=state.get("chat_history", ""),
         )
         answer = llm.invoke(prompt).content.strip()
+        if answerer is not None:
+            answerer.record_llm_answer(time.perf_counter() - start)
         return {**state, "answer": answer}
     
     # Create the visualization agent
@@ -68,13 +133,63 @@ def build_agent(db: SQLDatabase, llm) -> Any:
             return "visualize"
         return "end"
 
+    # Entry router: follow-up chart requests about the previous result skip SQL
+    def route_question(state: QAState) -> str:
+        if len(result_history) and is_followup_chart_request(state["question"]):
+            return "reuse"
+        return "query"
+
+    def reuse_result_fn(state: QAState) -> QAState:
+        previous = result_history.latest()
+        chart_type = requested_chart_type(state["question"])
+        chart_spec = None
+        if previous["chart_spec"] and chart_type:
+            # Only the chart type changes: re-render the previous spec locally
+            spec = json.loads(previous["chart_spec"])
+            spec["type"] = chart_type
+            chart_spec = json.dumps(spec)
+        else:
+            sql_result = previous["sql_result"]
+            data = sql_result["result"] if isinstance(sql_result, dict) and "result" in sql_result else sql_result
+            if speculation is not None:
+                chart_spec = speculation.take_chart(previous["sql_result"], chart_type)
+            if not chart_spec:
+                chart_spec = generate_chart_json(llm, state["question"], data, chart_type or "general")
+        new_state = {
+            **state,
+            "sql_result": previous["sql_result"],
+            "executed_sql": previous["executed_sql"],
+            "answer": f"Using the results of the previous question: \"{previous['question']}\".",
+            "reused_result": True,
+        }
+        if chart_spec:
+            new_state["chart_spec"] = chart_spec
+        return new_state
+
+    def remember_fn(state: QAState) -> QAState:
+        if state.get("reused_result"):
+            result_history.set_latest_chart(state.get("chart_spec"))
+        elif "sql_result" in state:
+            result_history.add(
+                state["question"], state.get("executed_sql"), state["sql_result"], state.get("chart_spec")
+            )
+        return state
+
     state_graph = StateGraph(QAState)
     state_graph.add_node("gen_sql", gen_sql)
     state_graph.add_node("exec_sql", exec_sql)
     state_graph.add_node("answer_node", answer_node_fn)
     state_graph.add_node("visualize", visualization_node_fn)
+    state_graph.add_node("reuse_result", reuse_result_fn)
+    state_graph.add_node("remember", remember_fn)
     
-    state_graph.set_entry_point("gen_sql")
+    state_graph.set_conditional_entry_point(
+        route_question,
+        {
+            "reuse": "reuse_result",
+            "query": "gen_sql"
+        }
+    )
     state_graph.add_edge("gen_sql", "exec_sql")
     state_graph.add_edge("exec_sql", "answer_node")
     state_graph.add_conditional_edges(
@@ -82,9 +197,11 @@ def build_agent(db: SQLDatabase, llm) -> Any:
         should_visualize,
         {
             "visualize": "visualize",
-            "end": END
+            "end": "remember"
         }
     )
-    state_graph.add_edge("visualize", END)
+    state_graph.add_edge("visualize", "remember")
+    state_graph.add_edge("reuse_result", "remember")
+    state_graph.add_edge("remember", END)
     
     return state_graph.compile()
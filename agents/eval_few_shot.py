@@ -0,0 +1,123 @@
+"""
+Offline evaluation of the few-shot example store.
+
+Runs a labelled set of questions against the sample database with and without
+the store and reports the first-try success rate and the mean number of LLM
+calls per question. A question succeeds when its SQL returns the same rows as
+the reference query; failed attempts are re-asked (with the previous SQL and
+error as feedback) up to ``--max-attempts`` times, like a user retrying.
+
+The store is evaluated leave-one-out: when answering a question, it holds the
+verified pairs for every other question in the set.
+
+Usage:
+    python -m agents.eval_few_shot --max-attempts 3
+"""
+import argparse
+import sqlite3
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_community.utilities import SQLDatabase
+
+from agents.chat_sql_agent import QueryOutput, build_sql_prompt
+from agents.example_store import ExampleStore, sql_text
+from db.setup import DB_PATH, DB_URI, init_sample_db
+from llm.loader import choose_llm
+
+EVAL_SET: List[Tuple[str, str]] = [
+    ("How many employees are there?", "SELECT COUNT(*) FROM employees"),
+    ("How many people work in Sales?", "SELECT COUNT(*) FROM employees WHERE department = 'Sales'"),
+    ("How many employees work in the Engineering department?",
+     "SELECT COUNT(*) FROM employees WHERE department = 'Engineering'"),
+    ("What is the average salary?", "SELECT AVG(salary) FROM employees"),
+    ("What is the average salary by department?",
+     "SELECT department, AVG(salary) FROM employees GROUP BY department"),
+    ("What is the total payroll per department?",
+     "SELECT department, SUM(salary) FROM employees GROUP BY department"),
+    ("Who is the highest paid employee?", "SELECT name FROM employees ORDER BY salary DESC LIMIT 1"),
+    ("Who is the youngest employee?", "SELECT name FROM employees ORDER BY age ASC LIMIT 1"),
+    ("List the top 3 highest paid employees", "SELECT name FROM employees ORDER BY salary DESC LIMIT 3"),
+    ("What are the salaries of my employees?", "SELECT name, salary FROM employees"),
+    ("Which employees are older than 30?", "SELECT name FROM employees WHERE age > 30"),
+    ("Which employees earn more than 80000?", "SELECT name FROM employees WHERE salary > 80000"),
+    ("What is the maximum salary in Engineering?",
+     "SELECT MAX(salary) FROM employees WHERE department = 'Engineering'"),
+    ("What is the minimum age of employees in Sales?",
+     "SELECT MIN(age) FROM employees WHERE department = 'Sales'"),
+    ("How many employees are in each department?",
+     "SELECT department, COUNT(*) FROM employees GROUP BY department"),
+    ("Which department has the most employees?",
+     "SELECT department FROM employees GROUP BY department ORDER BY COUNT(*) DESC LIMIT 1"),
+    ("What is the average age per department?",
+     "SELECT department, AVG(age) FROM employees GROUP BY department"),
+    ("List the employees in Marketing", "SELECT name FROM employees WHERE department = 'Marketing'"),
+]
+
+
+def _rows(conn: sqlite3.Connection, sql: str) -> Optional[Counter]:
+    """Result rows as a multiset (floats rounded), or None if the query fails."""
+    try:
+        rows = conn.execute(sql).fetchall()
+    except sqlite3.Error:
+        return None
+    return Counter(
+        tuple(round(value, 2) if isinstance(value, float) else value for value in row) for row in rows
+    )
+
+
+def evaluate(llm: Any, use_store: bool, max_attempts: int) -> Dict[str, float]:
+    """Evaluate the eval set and return first-try success rate and mean LLM calls."""
+    db = SQLDatabase.from_uri(DB_URI)
+    conn = sqlite3.connect(DB_PATH)
+    structured_llm = llm.with_structured_output(QueryOutput)
+    first_try, solved, calls = 0, 0, 0
+    for index, (question, reference_sql) in enumerate(EVAL_SET):
+        store: Optional[ExampleStore] = None
+        if use_store:
+            store = ExampleStore(path=None)
+            for other, (other_question, other_sql) in enumerate(EVAL_SET):
+                if other != index:
+                    store.add(other_question, other_sql)
+        expected = _rows(conn, reference_sql)
+        prompt_question = question
+        for attempt in range(1, max_attempts + 1):
+            calls += 1
+            sql = sql_text(structured_llm.invoke(build_sql_prompt(db, prompt_question, store)))
+            actual = _rows(conn, sql)
+            if actual == expected:
+                first_try += attempt == 1
+                solved += 1
+                break
+            problem = "failed to execute" if actual is None else "returned the wrong rows"
+            prompt_question = f"{question}\n(A previous attempt `{sql}` {problem}; try again.)"
+    conn.close()
+    total = len(EVAL_SET)
+    return {
+        "first_try_success": first_try / total,
+        "solved": solved / total,
+        "mean_llm_calls": calls / total,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the few-shot example store.")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    args = parser.parse_args()
+
+    load_dotenv()
+    init_sample_db()
+    model_name, llm = choose_llm()
+    print(f"\n{len(EVAL_SET)} questions, {model_name}, up to {args.max_attempts} attempts each\n")
+    print(f"{'mode':<16} {'first-try':>10} {'solved':>8} {'LLM calls/q':>12}")
+    for label, use_store in (("zero-shot", False), ("few-shot store", True)):
+        metrics = evaluate(llm, use_store, args.max_attempts)
+        print(
+            f"{label:<16} {metrics['first_try_success']:>10.0%} {metrics['solved']:>8.0%} "
+            f"{metrics['mean_llm_calls']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Local few-shot example store for SQL generation.
+
+Verified (question, SQL) pairs are added when a query executes successfully
+with a non-empty result, persisted as JSON lines, and indexed with a sparse
+TF-IDF model over word n-grams and character trigrams. The index is updated in
+place as examples are added or evicted, so a search never rebuilds it. The most
+similar examples are injected into the SQL generation prompt under a token
+budget.
+"""
+import ast
+import json
+import math
+import pathlib
+import re
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+EXAMPLES_PATH = pathlib.Path(__file__).parent.parent / "sql_examples.jsonl"
+
+EXAMPLES_HEADER = "Verified examples of similar questions and the SQL that answered them correctly:"
+
+
+class SQLExample(TypedDict):
+    question: str
+    sql: str
+
+
+def sql_text(executed_sql: Any) -> str:
+    """Return the SQL string from a raw query or a ``{"query": ...}`` structured output."""
+    if isinstance(executed_sql, dict):
+        executed_sql = executed_sql.get("query", "")
+    executed_sql = str(executed_sql or "").strip()
+    if executed_sql.startswith("{") and "query" in executed_sql:
+        # [ExecutedSQL] entries in the chat history hold the repr of the structured output
+        try:
+            return str(ast.literal_eval(executed_sql)["query"]).strip()
+        except (ValueError, SyntaxError, KeyError, TypeError):
+            pass
+    return executed_sql
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams/bigrams plus character trigrams (so "salary" matches "salaries")."""
+    words = re.findall(r"[a-z0-9_]+", text.lower())
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        features.update(f"#3:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return features
+
+
+class _SparseIndex:
+    """
+    TF-IDF vectors stored as flat CSR-style arrays with one entry per (document,
+    term). Adding a document appends its entries and evicting the oldest moves a
+    start offset, so both are proportional to the document's size. IDF weights
+    and document norms are applied at search time in a single pass over the
+    entries.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.vocab: Dict[str, int] = {}
+        self.df = np.zeros(1024, dtype=np.int32)
+        self.terms = np.zeros(capacity, dtype=np.int32)
+        self.weights = np.zeros(capacity, dtype=np.float32)
+        self.rows = np.zeros(capacity, dtype=np.int64)
+        self.start = 0
+        self.end = 0
+        # Number of entries of each live document, oldest first
+        self.sizes: deque = deque()
+        # Row number of the oldest live document
+        self.first_row = 0
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def _reserve(self, extra: int) -> None:
+        if self.end + extra <= len(self.terms):
+            return
+        live = self.end - self.start
+        capacity = len(self.terms)
+        while live + extra > capacity // 2:
+            capacity *= 2
+        for name in ("terms", "weights", "rows"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype) if capacity != len(old) else old
+            new[:live] = old[self.start:self.end]
+            setattr(self, name, new)
+        self.start, self.end = 0, live
+
+    def add(self, features: Counter) -> None:
+        ids = [self.vocab.setdefault(term, len(self.vocab)) for term in features]
+        if len(self.vocab) > len(self.df):
+            self.df = np.concatenate([self.df, np.zeros(max(len(self.df), len(self.vocab)), dtype=np.int32)])
+        self.df[ids] += 1
+        self._reserve(len(ids))
+        stop = self.end + len(ids)
+        self.terms[self.end:stop] = ids
+        self.weights[self.end:stop] = [1 + math.log(count) for count in features.values()]
+        self.rows[self.end:stop] = self.first_row + len(self.sizes)
+        self.end = stop
+        self.sizes.append(len(ids))
+
+    def evict_oldest(self) -> None:
+        size = self.sizes.popleft()
+        self.df[self.terms[self.start:self.start + size]] -= 1
+        self.start += size
+        self.first_row += 1
+
+    def scores(self, features: Counter) -> np.ndarray:
+        """Cosine similarity of ``features`` to each live document, oldest first."""
+        n_docs = len(self.sizes)
+        idf = np.log((1 + n_docs) / (1 + self.df[:len(self.vocab)])).astype(np.float32) + 1
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        for term, count in features.items():
+            if term in self.vocab:
+                query[self.vocab[term]] = 1 + math.log(count)
+        # Terms of evicted documents are no longer in the model
+        query *= np.where(self.df[:len(self.vocab)] > 0, idf, 0)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return np.zeros(n_docs, dtype=np.float32)
+        terms = self.terms[self.start:self.end]
+        rows = self.rows[self.start:self.end] - self.first_row
+        weights = self.weights[self.start:self.end] * idf[terms]
+        norms = np.sqrt(np.bincount(rows, weights * weights, minlength=n_docs))
+        dots = np.bincount(rows, weights * query[terms], minlength=n_docs)
+        return dots / (np.where(norms == 0, 1, norms) * query_norm)
+
+
+class ExampleStore:
+    """
+    Nearest-neighbour store of verified (question, SQL) examples. Safe to share
+    between threads (the CLI adds examples while speculation searches them).
+    """
+
+    def __init__(
+        self,
+        path: Optional[pathlib.Path] = EXAMPLES_PATH,
+        k: int = 3,
+        token_budget: int = 400,
+        min_score: float = 0.2,
+        max_examples: int = 2000,
+    ):
+        self.path = pathlib.Path(path) if path else None
+        self.k = k
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.max_examples = max_examples
+        self._examples: List[SQLExample] = []
+        self._keys: set = set()
+        self._index = _SparseIndex()
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    @staticmethod
+    def _key(question: str, sql: str) -> Tuple[str, str]:
+        return " ".join(question.lower().split()), " ".join(sql.split())
+
+    def _add(self, example: SQLExample) -> bool:
+        key = self._key(example["question"], example["sql"])
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._examples.append(example)
+        self._index.add(_features(example["question"]))
+        if len(self._examples) > self.max_examples:
+            # Keep the index bounded; the most recent examples win
+            oldest = self._examples.pop(0)
+            self._keys.discard(self._key(oldest["question"], oldest["sql"]))
+            self._index.evict_oldest()
+        return True
+
+    def add(self, question: str, sql: Any) -> bool:
+        """Add a verified example. Returns False if it was empty or already stored."""
+        example: SQLExample = {"question": question.strip(), "sql": sql_text(sql)}
+        if not example["question"] or not example["sql"]:
+            return False
+        with self._lock:
+            if not self._add(example):
+                return False
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(example) + "\n")
+        return True
+
+    def search(self, question: str, k: Optional[int] = None) -> List[Tuple[float, SQLExample]]:
+        """Return up to ``k`` (cosine similarity, example) pairs, most similar first."""
+        k = self.k if k is None else k
+        features = _features(question)
+        with self._lock:
+            if not self._examples or k <= 0:
+                return []
+            scores = self._index.scores(features)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), self._examples[i]) for i in top if scores[i] >= self.min_score]
+
+    def format_examples(self, question: str) -> str:
+        """Format the most similar examples for a prompt, within the token budget."""
+        blocks = [EXAMPLES_HEADER]
+        used = estimate_tokens(EXAMPLES_HEADER)
+        for _score, example in self.search(question):
+            block = f"Question: {example['question']}\nSQL: {example['sql']}"
+            cost = estimate_tokens(block)
+            if used + cost > self.token_budget:
+                break
+            blocks.append(block)
+            used += cost
+        return "\n\n".join(blocks) if len(blocks) > 1 else ""
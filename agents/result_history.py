@@ -0,0 +1,115 @@
+"""
+Per-session retention of the latest query result, so follow-up chart requests
+("plot that", "as a pie chart instead") can reuse it without generating and
+executing SQL again.
+"""
+import json
+import re
+import zlib
+from typing import Any, Dict, Optional, TypedDict
+
+CHART_TYPES = ("pie", "bar", "line")
+
+_CHART_WORDS = re.compile(r"\b(chart|graph|plot|visuali[sz]e|visuali[sz]ation|draw|diagram|pie|bar|line)\b", re.IGNORECASE)
+_CHART_TYPE = re.compile(r"\b(pie|bar|line)\b", re.IGNORECASE)
+_LEAD = r"^(?:(?:can|could|would) you |please |now |ok(?:ay)?,? |and |then )*"
+_STYLE = r"(?:as|in|into|with) (?:a |an )?(?:pie|bar|line)?\s*(?:chart|graph|plot|diagram)?"
+# The question must be *about* the previous result, not merely mention a chart
+# word and a pronoun ("... hired in the last year" is a new question)
+_FOLLOWUP_PATTERNS = [
+    # "plot that", "visualize the results as a bar chart"
+    re.compile(
+        _LEAD + r"(?:plot|chart|graph|visuali[sz]e|draw|show|display|render|turn|make)(?: me)? "
+        r"(?:that|this|it|these|those|them|the (?:previous |last |same )?(?:results?|data|output|numbers|answer))"
+        r"(?P<rest>.*)$",
+        re.IGNORECASE,
+    ),
+    # "as a pie chart instead", "show it as a line graph"
+    re.compile(_LEAD + r"(?:(?:show|make|do|draw|plot|put) (?:it|that|this|them) )?" + _STYLE + r"(?P<rest>.*)$", re.IGNORECASE),
+    # "pie chart instead"
+    re.compile(_LEAD + r"(?:a |an )?(?:pie|bar|line) (?:chart|graph|plot)(?P<rest>.*)$", re.IGNORECASE),
+]
+# What may follow the anaphoric part: chart styling and filler only
+_FOLLOWUP_REST = re.compile(
+    r"(?:\s*" + _STYLE + r"|\s*(?:instead|please|too|again|now|then)|\s*of (?:that|this|it|them|the results?))*\s*[.!?]*",
+    re.IGNORECASE,
+)
+
+
+class ResultEntry(TypedDict):
+    question: str
+    executed_sql: Any
+    chart_spec: Optional[str]
+    # zlib-compressed JSON of the sql_result
+    payload: bytes
+
+
+def is_followup_chart_request(question: str) -> bool:
+    """Detect chart requests that refer to the previous result; when unsure, say no (run SQL)."""
+    question = " ".join(question.split())
+    if not _CHART_WORDS.search(question):
+        return False
+    for pattern in _FOLLOWUP_PATTERNS:
+        match = pattern.match(question)
+        if match and _FOLLOWUP_REST.fullmatch(match.group("rest")):
+            return True
+    return False
+
+
+def requested_chart_type(question: str) -> Optional[str]:
+    """Return the chart type named in the question, if any."""
+    match = _CHART_TYPE.search(question)
+    return match.group(1).lower() if match else None
+
+
+def is_error_result(sql_result: Any) -> bool:
+    """Whether an ``exec_sql`` result holds an error instead of rows."""
+    if isinstance(sql_result, dict):
+        return str(sql_result.get("result", "")).startswith("Error:")
+    return "ERROR:" in str(sql_result)
+
+
+class ResultHistory:
+    """
+    The latest successful result of a session, compressed and under a memory cap.
+    Follow-ups only ever refer to the previous result, so nothing older is kept.
+    """
+
+    def __init__(self, max_bytes: int = 1_000_000):
+        self.max_bytes = max_bytes
+        self._entry: Optional[ResultEntry] = None
+
+    def __len__(self) -> int:
+        return 0 if self._entry is None else 1
+
+    def add(self, question: str, executed_sql: Any, sql_result: Any, chart_spec: Optional[str] = None) -> bool:
+        """
+        Retain a result in place of the previous one. Errors are skipped; a result
+        larger than the memory cap clears the history, so a follow-up cannot pick
+        up an older, unrelated result.
+        """
+        if sql_result is None or is_error_result(sql_result):
+            return False
+        payload = zlib.compress(json.dumps(sql_result, default=str).encode("utf-8"))
+        if len(payload) > self.max_bytes:
+            self._entry = None
+            return False
+        self._entry = {"question": question, "executed_sql": executed_sql, "chart_spec": chart_spec, "payload": payload}
+        return True
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Return the most recent entry with its ``sql_result`` decompressed, or None."""
+        entry = self._entry
+        if entry is None:
+            return None
+        return {
+            "question": entry["question"],
+            "executed_sql": entry["executed_sql"],
+            "chart_spec": entry["chart_spec"],
+            "sql_result": json.loads(zlib.decompress(entry["payload"]).decode("utf-8")),
+        }
+
+    def set_latest_chart(self, chart_spec: Optional[str]) -> None:
+        """Attach a (re-)rendered chart spec to the most recent entry."""
+        if self._entry is not None and chart_spec:
+            self._entry["chart_spec"] = chart_spec
@@ -0,0 +1,356 @@
+"""
+Speculative precomputation of likely follow-ups while the user is reading an answer.
+
+After each turn the CLI hands the result to a ``SpeculativeEngine``, which uses
+the idle time in ``input()`` to warm the schema cache, build a chart spec and
+low-DPI preview renders for the current result, and pre-generate (and execute)
+SQL for common drill-down follow-ups. Work runs on a background thread within a
+CPU, wall-clock and token budget and is cancelled as soon as the next question
+arrives. Speculative SQLite queries are interrupted mid-statement on
+cancellation or at the deadline; an LLM request that is already in flight cannot
+be aborted, so the worker stops waiting for it at the deadline and discards its
+result (the request itself ends when the client's own timeout does). The agent
+and CLI consult the engine first and count a hit whenever speculation served the
+next turn.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+
+from agents.chat_sql_agent import QueryOutput, build_sql_prompt, get_table_info_cached
+from agents.example_store import ExampleStore, estimate_tokens, sql_text
+from agents.result_history import CHART_TYPES, is_error_result
+from agents.visualization_agent import generate_chart_json
+from prompts.sql_prompts import DRILL_DOWN_TEMPLATES
+from prompts.visualization_prompts import VISUALIZATION_PROMPT
+from visualization.chart_renderer import render_chart
+
+SPECULATIVE_DPI = 72
+SPECULATIVE_CHART_QUESTION = "Plot the results"
+# SQLite virtual machine instructions between cancellation checks
+PROGRESS_INTERVAL = 10_000
+# Output tokens reserved per speculative LLM call
+OUTPUT_TOKEN_RESERVE = {"chart": 300, "sql": 100}
+
+_TEXT_COLUMN = re.compile(r"^\s*[\"`\[]?(\w+)[\"`\]]?\s+(?:TEXT|VARCHAR|NVARCHAR|CHAR)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a follow-up for matching ("Break that down by Department!" -> "break it down by department")."""
+    words = re.findall(r"[a-z0-9_]+", question.lower())
+    return " ".join("it" if word in {"that", "this", "them", "those"} else word for word in words)
+
+
+def _spec_key(chart_spec: Any) -> str:
+    spec = json.loads(chart_spec) if isinstance(chart_spec, str) else chart_spec
+    return json.dumps(spec, sort_keys=True)
+
+
+def _result_key(sql_result: Any) -> str:
+    return json.dumps(sql_result, sort_keys=True, default=str)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prompt_tokens(prompt: Any) -> int:
+    if isinstance(prompt, list):
+        return sum(estimate_tokens(str(message.content)) for message in prompt)
+    if hasattr(prompt, "to_messages"):
+        return _prompt_tokens(prompt.to_messages())
+    return estimate_tokens(str(prompt))
+
+
+class SpeculativeEngine:
+    """Cancellable background precomputation with hit-rate accounting."""
+
+    def __init__(
+        self,
+        db: Any,
+        llm: Any,
+        example_store: Optional[ExampleStore] = None,
+        max_tokens: int = 3000,
+        max_cpu_seconds: float = 2.0,
+        max_wall_seconds: float = 10.0,
+        preview_dpi: int = SPECULATIVE_DPI,
+        max_drill_downs: int = 3,
+    ):
+        self.db = db
+        self.llm = llm
+        self.example_store = example_store
+        self.max_tokens = max_tokens
+        self.max_cpu_seconds = max_cpu_seconds
+        self.max_wall_seconds = max_wall_seconds
+        self.preview_dpi = preview_dpi
+        self.max_drill_downs = max_drill_downs
+        self._structured_llm = llm.with_structured_output(QueryOutput)
+        # LLM calls run here so the speculative worker can stop waiting at the deadline
+        self._llm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculation-llm")
+        # Previews are throwaway files: unused ones are deleted when the next round
+        # starts, a served one once the turn after it begins
+        self._preview_dir = tempfile.mkdtemp(prefix="speculation-")
+        self._served_previews: List[str] = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._charts: Dict[str, str] = {}
+        self._renders: Dict[str, str] = {}
+        self._sql: Dict[str, Any] = {}
+        self._results: Dict[str, Any] = {}
+        self._round_active = False
+        self._round_hit = False
+        self._round_tokens = 0
+        self.stats: Dict[str, Any] = {
+            "rounds": 0,
+            "served_rounds": 0,
+            "chart_hits": 0,
+            "render_hits": 0,
+            "sql_hits": 0,
+            "result_hits": 0,
+            "tokens": 0,
+            "cpu_seconds": 0.0,
+        }
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def speculate(self, state: Dict[str, Any]) -> None:
+        """Start precomputing follow-ups for the result of the turn that just finished."""
+        self._cancel.set()
+        cancel = threading.Event()
+        with self._lock:
+            self._cancel = cancel
+            stale_previews = [path for path in self._renders.values() if path not in self._served_previews]
+            self._charts, self._renders, self._sql, self._results = {}, {}, {}, {}
+            self._round_active = True
+            self._round_hit = False
+            self._round_tokens = 0
+        for path in stale_previews:
+            _remove(path)
+        thread = threading.Thread(target=self._run, args=(dict(state), cancel), daemon=True)
+        thread.start()
+
+    def begin_turn(self) -> None:
+        """Cancel outstanding work when the next question arrives; its results stay servable."""
+        self._cancel.set()
+        with self._lock:
+            if self._round_active:
+                self.stats["rounds"] += 1
+                self._round_active = False
+            served, self._served_previews = self._served_previews, []
+        for path in served:
+            _remove(path)
+
+    def close(self) -> None:
+        """Cancel outstanding work and delete the preview files."""
+        self._cancel.set()
+        self._llm_pool.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self._preview_dir, ignore_errors=True)
+
+    def _run(self, state: Dict[str, Any], cancel: threading.Event) -> None:
+        start = time.thread_time()
+        deadline = time.monotonic() + self.max_wall_seconds
+        tasks: List[Callable[[], None]] = [lambda: get_table_info_cached(self.db)]
+        sql_result = state.get("sql_result")
+        if sql_result is not None and not is_error_result(sql_result):
+            tasks.append(lambda: self._speculate_chart(state, cancel, start, deadline))
+            tasks.append(lambda: self._speculate_drill_downs(state, cancel, start, deadline))
+        for task in tasks:
+            if not self._within_budget(cancel, start, deadline):
+                break
+            try:
+                task()
+            except Exception:
+                # Speculation is best effort; the next turn simply misses
+                pass
+        with self._lock:
+            self.stats["cpu_seconds"] += time.thread_time() - start
+
+    def _within_budget(self, cancel: threading.Event, start: float, deadline: float, tokens: int = 0) -> bool:
+        if cancel.is_set() or time.monotonic() >= deadline or time.thread_time() - start >= self.max_cpu_seconds:
+            return False
+        return self._round_tokens + tokens <= self.max_tokens
+
+    def _call_llm(self, fn: Callable[[], Any], cancel: threading.Event, deadline: float) -> Optional[Any]:
+        """Run an LLM call, giving up (and discarding its result) at cancellation or the deadline."""
+        future = self._llm_pool.submit(fn)
+        while True:
+            remaining = deadline - time.monotonic()
+            if cancel.is_set() or remaining <= 0:
+                future.cancel()
+                return None
+            try:
+                return future.result(timeout=min(remaining, 0.1))
+            except FutureTimeoutError:
+                continue
+
+    def _run_query(self, sql: str, cancel: threading.Event, deadline: float) -> Optional[str]:
+        """Run a query like ``db.run``; plain SQLite databases are interrupted at cancellation or the deadline."""
+        engine = getattr(self.db, "_engine", None)
+        if type(self.db).run is not SQLDatabase.run or engine is None or engine.dialect.name != "sqlite":
+            output = self.db.run_no_throw(sql)
+            return None if str(output).startswith("Error:") else output
+        with engine.connect() as connection:
+            raw = connection.connection.driver_connection
+            raw.set_progress_handler(lambda: int(cancel.is_set() or time.monotonic() >= deadline), PROGRESS_INTERVAL)
+            try:
+                rows = raw.execute(sql).fetchall()
+            except sqlite3.Error:
+                # Includes "interrupted"
+                return None
+            finally:
+                raw.set_progress_handler(None, 0)
+        # Same formatting as SQLDatabase.run, so results match exec_sql's
+        result = [tuple(truncate_word(value, length=self.db._max_string_length) for value in row) for row in rows]
+        return str(result) if result else ""
+
+    def _spend(self, tokens: int) -> None:
+        with self._lock:
+            self._round_tokens += tokens
+            self.stats["tokens"] += tokens
+
+    def _store(self, cancel: threading.Event, table: str, key: str, value: Any) -> bool:
+        # Results of a stale worker (a newer round has started) are dropped
+        with self._lock:
+            if self._cancel is cancel:
+                getattr(self, table)[key] = value
+                return True
+            return False
+
+    # -- tasks ---------------------------------------------------------------
+
+    def _speculate_chart(self, state: Dict[str, Any], cancel: threading.Event, start: float, deadline: float) -> None:
+        sql_result = state["sql_result"]
+        base_spec = state.get("chart_spec")
+        if not base_spec:
+            data = sql_result["result"] if isinstance(sql_result, dict) and "result" in sql_result else sql_result
+            prompt = VISUALIZATION_PROMPT.format(question=SPECULATIVE_CHART_QUESTION, data=json.dumps(data, indent=2))
+            tokens = estimate_tokens(prompt) + OUTPUT_TOKEN_RESERVE["chart"]
+            # Leave room for the retry generate_chart_json makes when a response cannot be salvaged
+            if not self._within_budget(cancel, start, deadline, 2 * tokens):
+                return
+            self._spend(tokens)
+            # Background calls are kept out of the session's chart spec stats
+            chart_stats: Counter = Counter()
+            base_spec = self._call_llm(
+                lambda: generate_chart_json(
+                    self.llm, SPECULATIVE_CHART_QUESTION, data, log=lambda message: None, stats=chart_stats
+                ),
+                cancel,
+                deadline,
+            )
+            if chart_stats["extra_llm_call"]:
+                self._spend(tokens)
+            if not base_spec:
+                return
+            self._store(cancel, "_charts", _result_key(sql_result), base_spec)
+            variants = [json.loads(base_spec)]
+        else:
+            # The current chart was already rendered; preview the other chart types
+            variants = []
+        spec = json.loads(base_spec)
+        for chart_type in CHART_TYPES:
+            if chart_type != spec.get("type"):
+                variants.append({**spec, "type": chart_type})
+        for variant in variants:
+            if not self._within_budget(cancel, start, deadline):
+                return
+            path = render_chart(variant, dpi=self.preview_dpi, output_dir=self._preview_dir)
+            if path and not self._store(cancel, "_renders", _spec_key(variant), path):
+                _remove(path)
+
+    def _speculate_drill_downs(
+        self, state: Dict[str, Any], cancel: threading.Event, start: float, deadline: float
+    ) -> None:
+        previous_sql = sql_text(state.get("executed_sql")).lower()
+        columns = [c for c in _TEXT_COLUMN.findall(get_table_info_cached(self.db)) if c.lower() not in previous_sql]
+        followups = []
+        for user_template, question_template in DRILL_DOWN_TEMPLATES:
+            for column in (columns if "{column}" in user_template else [None]):
+                followups.append((
+                    user_template.format(column=column),
+                    question_template.format(question=state["question"], column=column),
+                ))
+        for user_question, full_question in followups[:self.max_drill_downs]:
+            prompt = build_sql_prompt(self.db, full_question, self.example_store)
+            tokens = _prompt_tokens(prompt) + OUTPUT_TOKEN_RESERVE["sql"]
+            if not self._within_budget(cancel, start, deadline, tokens):
+                return
+            self._spend(tokens)
+            sql_query = self._call_llm(lambda: self._structured_llm.invoke(prompt), cancel, deadline)
+            if sql_query is None:
+                return
+            self._store(cancel, "_sql", normalize_question(user_question), sql_query)
+            output = self._run_query(sql_text(sql_query), cancel, deadline)
+            if output:
+                self._store(cancel, "_results", sql_text(sql_query), {"result": output})
+
+    # -- serving -------------------------------------------------------------
+
+    def _hit(self, counter: str) -> None:
+        self.stats[counter] += 1
+        if not self._round_hit:
+            self._round_hit = True
+            self.stats["served_rounds"] += 1
+
+    def take_chart(self, sql_result: Any, chart_type: Optional[str] = None) -> Optional[str]:
+        """Speculated chart spec for ``sql_result``, switched to ``chart_type`` if given."""
+        with self._lock:
+            chart_spec = self._charts.get(_result_key(sql_result))
+            if chart_spec is None:
+                return None
+            self._hit("chart_hits")
+        if chart_type:
+            chart_spec = json.dumps({**json.loads(chart_spec), "type": chart_type})
+        return chart_spec
+
+    def take_render(self, chart_spec: Any) -> Optional[str]:
+        """
+        Path of a low-resolution preview rendered ahead of time for exactly this
+        chart spec. The file is kept until the next question arrives.
+        """
+        with self._lock:
+            path = self._renders.get(_spec_key(chart_spec))
+            if path:
+                self._hit("render_hits")
+                self._served_previews.append(path)
+            return path
+
+    def take_sql(self, question: str) -> Optional[Any]:
+        """Pre-generated SQL for a predicted follow-up question."""
+        with self._lock:
+            sql_query = self._sql.get(normalize_question(question))
+            if sql_query is not None:
+                self._hit("sql_hits")
+            return sql_query
+
+    def take_result(self, executed_sql: Any) -> Optional[Any]:
+        """Result of a pre-executed speculative query."""
+        with self._lock:
+            result = self._results.get(sql_text(executed_sql))
+            if result is not None:
+                self._hit("result_hits")
+            return result
+
+    def format_report(self) -> str:
+        stats = self.stats
+        rate = stats["served_rounds"] / stats["rounds"] if stats["rounds"] else 0.0
+        return (
+            f"Speculation served {stats['served_rounds']} of {stats['rounds']} follow-up turns ({rate:.0%}); "
+            f"hits: {stats['chart_hits']} chart, {stats['render_hits']} render, "
+            f"{stats['sql_hits']} SQL, {stats['result_hits']} result; "
+            f"spent ~{stats['tokens']} tokens, {stats['cpu_seconds']:.2f} CPU-s."
+        )
@@ -1,16 +1,13 @@
 """
 Visualization agent for generating chart specifications based on data and user requests.
 """
-from typing import Any, Dict, List, TypedDict, Optional
+from collections import Counter
+from typing import Any, Callable, Dict, List, TypedDict, Optional
 from typing_extensions import Annotated
 import json
 import re
 from prompts.visualization_prompts import VISUALIZATION_PROMPT
-from langchain_core.output_parsers import JsonOutputParser
-
-class VisualizationOutput(TypedDict):
-    """Chart specification in JSON format."""
-    chart_json: Annotated[str, ..., "JSON string containing chart specification"]
+from visualization.chart_spec import parse_chart_spec, record_chart_spec_outcome
 
 class VisualizationRequestOutput(TypedDict):
     """Output for determining if a request is for visualization."""
@@ -89,6 +86,86 @@ def is_visualization_request(llm, question: str) -> Dict[str, Any]:
             "visualization_type": "general"
         }
 
+def generate_chart_json(
+    llm,
+    question: str,
+    data: Any,
+    visualization_type: str = "general",
+    log: Callable[[str], None] = print,
+    stats: Optional[Counter] = None,
+) -> Optional[str]:
+    """
+    Generate a chart specification JSON string for the given data and request.
+    Returns None if no specification could be produced. Progress messages go to ``log``;
+    outcomes are counted in ``stats`` (the session's chart spec stats by default).
+    """
+    try:
+        # Format the data as JSON string
+        data_json = json.dumps(data, indent=2)
+        
+        # Format the prompt
+        prompt = VISUALIZATION_PROMPT.format(
+            question=question,
+            data=data_json
+        )
+        
+        chart_type = visualization_type if visualization_type != "general" else None
+        
+        # One response is normally enough: fences, comments, trailing commas and
+        # truncation are repaired locally instead of asking the LLM again
+        content = llm.invoke(prompt).content
+        try:
+            chart_spec, repairs = parse_chart_spec(content, chart_type)
+        except ValueError as e:
+            log(f"Chart JSON could not be salvaged ({e}); asking the LLM once more")
+            record_chart_spec_outcome("extra_llm_call", stats=stats)
+            retry_prompt = (
+                f"{prompt}\n\nYour previous response could not be used ({e}). "
+                "Respond with ONLY the JSON object."
+            )
+            chart_spec, repairs = parse_chart_spec(llm.invoke(retry_prompt).content, chart_type)
+            record_chart_spec_outcome("retried", repairs, stats)
+        else:
+            record_chart_spec_outcome("repaired" if repairs else "clean", repairs, stats)
+        if repairs:
+            log(f"Repaired chart JSON locally: {', '.join(repairs)}")
+        else:
+            log("Successfully generated chart JSON")
+        return json.dumps(chart_spec)
+        
+    except Exception as e:
+        log(f"Failed to generate chart specification: {e}")
+        record_chart_spec_outcome("fallback", stats=stats)
+        # Fallback to a simple chart specification if LLM fails
+        chart_type = visualization_type if visualization_type != "general" else determine_chart_type(question, data)
+        
+        # Extract column names and values
+        if len(data) > 0 and isinstance(data[0], dict):
+            columns = list(data[0].keys())
+            
+            if len(columns) >= 2:
+                labels = [str(item.get(columns[0], "")) for item in data]
+                values = [item.get(columns[1], 0) for item in data]
+                
+                fallback_spec = {
+                    "type": chart_type,
+                    "title": f"{chart_type.capitalize()} Chart of {columns[1]} by {columns[0]}",
+                    "labels": labels,
+                    "datasets": [
+                        {
+                            "label": columns[1],
+                            "data": values,
+                            "backgroundColor": ["#36a2eb", "#ff6384", "#4bc0c0", "#ffcd56", "#9966ff"]
+                        }
+                    ],
+                    "options": {}
+                }
+                
+                return json.dumps(fallback_spec)
+        
+        # If all else fails, there is no chart
+        return None
+
 def build_visualization_agent(llm) -> Any:
     """Build a visualization agent that generates chart specifications."""
     
@@ -116,97 +193,9 @@ def build_visualization_agent(llm) -> Any:
             # No visualization requested
             return state
             
-        try:
-            # Format the data as JSON string
-            data_json = json.dumps(data, indent=2)
-            
-            # Format the prompt
-            prompt = VISUALIZATION_PROMPT.format(
-                question=question,
-                data=data_json
-            )
-            
-            # Try multiple approaches to get valid JSON
-            chart_json = None
-            
-            # Approach 1: Try with structured output using function calling
-            try:
-                structured_llm = llm.with_structured_output(VisualizationOutput, method="function_calling")
-                result = structured_llm.invoke(prompt)
-                chart_json = result["chart_json"]
-                print("Successfully generated chart JSON using structured output")
-            except Exception as e:
-                print(f"Structured output failed: {e}")
-                
-                # Approach 2: Try with direct JSON parsing
-                try:
-                    parser = JsonOutputParser()
-                    chain = prompt | llm | parser
-                    result = chain.invoke({})
-                    chart_json = json.dumps(result)
-                    print("Successfully generated chart JSON using direct parsing")
-                except Exception as e2:
-                    print(f"Direct JSON parsing failed: {e2}")
-                    
-                    # Approach 3: Try with raw completion and manual extraction
-                    try:
-                        completion = llm.invoke(prompt)
-                        content = completion.content
-                        
-                        # Try to extract JSON from the completion
-                        if "```json" in content:
-                            json_str = content.split("```json")[1].split("```")[0].strip()
-                        elif "```" in content:
-                            json_str = content.split("```")[1].split("```")[0].strip()
-                        else:
-                            json_str = content.strip()
-                        
-                        # Parse the JSON to validate it
-                        json.loads(json_str)
-                        chart_json = json_str
-                        print("Successfully generated chart JSON using raw completion")
-                    except Exception as e3:
-                        print(f"Raw completion extraction failed: {e3}")
-            
-            # If we have a valid chart JSON, add it to the state
-            if chart_json:
-                # Validate JSON
-                json.loads(chart_json)
-                return {**state, "chart_spec": chart_json}
-            
-            # If all approaches failed, fall back to a simple chart specification
-            raise Exception("All approaches to generate chart JSON failed")
-            
-        except Exception as e:
-            print(f"Failed to generate chart specification: {e}")
-            # Fallback to a simple chart specification if LLM fails
-            chart_type = viz_request["visualization_type"] if viz_request["visualization_type"] != "general" else determine_chart_type(question, data)
-            
-            # Extract column names and values
-            if len(data) > 0 and isinstance(data[0], dict):
-                columns = list(data[0].keys())
-                
-                if len(columns) >= 2:
-                    labels = [str(item.get(columns[0], "")) for item in data]
-                    values = [item.get(columns[1], 0) for item in data]
-                    
-                    fallback_spec = {
-                        "type": chart_type,
-                        "title": f"{chart_type.capitalize()} Chart of {columns[1]} by {columns[0]}",
-                        "labels": labels,
-                        "datasets": [
-                            {
-                                "label": columns[1],
-                                "data": values,
-                                "backgroundColor": ["#36a2eb", "#ff6384", "#4bc0c0", "#ffcd56", "#9966ff"]
-                            }
-                        ],
-                        "options": {}
-                    }
-                    
-                    return {**state, "chart_spec": json.dumps(fallback_spec)}
-            
-            # If all else fails, return state unchanged
-            return state
+        chart_json = generate_chart_json(llm, question, data, viz_request["visualization_type"])
+        if chart_json:
+            return {**state, "chart_spec": chart_json}
+        return state
     
     return generate_chart_spec
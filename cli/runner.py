@@ -7,6 +7,7 @@ import platform
 import subprocess
 import traceback
 from visualization.chart_renderer import render_chart
+from visualization.chart_spec import CHART_SPEC_STATS, format_chart_spec_stats
 
 
 def _update_memory(memory: ConversationBufferMemory, question: str, answer: str, executed_sql: str) -> None:
@@ -38,9 +39,10 @@ def _open_image_in_viewer(image_path: str) -> bool:
         return False
 
 
-def _process_visualization(chart_json: str) -> None:
+def _process_visualization(chart_json: str, speculation: Optional[Any] = None) -> None:
     """
     Process a chart JSON specification, render it, and display it.
+    A preview rendered speculatively for the same specification is only reported; the full-resolution chart is opened.
     """
     print("A visualization has been generated based on your request.")
     
@@ -48,6 +50,11 @@ def _process_visualization(chart_json: str) -> None:
         # Parse the chart JSON if it's a string
         chart_data = json.loads(chart_json) if isinstance(chart_json, str) else chart_json
         
+        # A low-resolution speculative preview is only mentioned; the final chart follows right away
+        preview_path = speculation.take_render(chart_data) if speculation is not None else None
+        if preview_path:
+            print(f"Preview (rendered while you were reading the previous answer): {preview_path}")
+
         # Generate the chart image
         chart_path = render_chart(chart_data)
         
@@ -72,18 +79,19 @@ def _process_visualization(chart_json: str) -> None:
         traceback.print_exc()
 
 
-def _process_agent_response(result: Dict[str, Any]) -> Dict[str, str]:
+def _process_agent_response(result: Dict[str, Any], speculation: Optional[Any] = None) -> Dict[str, str]:
     """
     Process the agent's response and extract relevant information.
     Returns a dictionary with answer and executed_sql.
     """
     answer = result["answer"]
-    executed_sql = result.get("executed_sql", "")
+    # A reused result ran no SQL this turn; its query is already in the previous turn
+    executed_sql = "" if result.get("reused_result") else result.get("executed_sql", "")
     print(f"Answer: {answer}\n")
     
     # Handle chart specification if present
     if "chart_spec" in result:
-        _process_visualization(result["chart_spec"])
+        _process_visualization(result["chart_spec"], speculation)
     
     return {"answer": answer, "executed_sql": executed_sql}
 
@@ -107,13 +115,19 @@ def _get_user_input() -> Optional[str]:
     return question
 
 
-def run_cli(model_name: str, agent_app: Any) -> None:  # noqa: D401
+def run_cli(
+    model_name: str, agent_app: Any, speculation: Optional[Any] = None, answerer: Optional[Any] = None
+) -> None:  # noqa: D401
     """
     Run the CLI interface for the SQL agent.
     
     Args:
         model_name: Name of the LLM model being used
         agent_app: The compiled LangGraph agent application
+        speculation: Optional SpeculativeEngine that precomputes likely follow-ups
+            while waiting for the next question
+        answerer: Optional TemplatedAnswerer whose templated/LLM answer counts
+            are reported on exit
     """
     memory = ConversationBufferMemory(return_messages=True)
     print(
@@ -126,6 +140,8 @@ def run_cli(model_name: str, agent_app: Any) -> None:  # noqa: D401
         question = _get_user_input()
         if question is None:
             break
+        if speculation is not None:
+            speculation.begin_turn()
 
         # Prepare state with chat history
         history_text = "\n".join(
@@ -137,7 +153,19 @@ def run_cli(model_name: str, agent_app: Any) -> None:  # noqa: D401
         result = agent_app.invoke(state)
         
         # Process the agent's response
-        response = _process_agent_response(result)
+        response = _process_agent_response(result, speculation)
         
         # Update memory
         _update_memory(memory, question, response["answer"], response["executed_sql"])
+
+        # Use the user's think time to precompute likely follow-ups
+        if speculation is not None:
+            speculation.speculate(result)
+
+    if speculation is not None:
+        speculation.close()
+        print(speculation.format_report())
+    if answerer is not None:
+        print(answerer.format_report())
+    if CHART_SPEC_STATS:
+        print(format_chart_spec_stats())
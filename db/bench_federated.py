@@ -0,0 +1,103 @@
+"""
+Scaling benchmark for federated execution over SQLite shards.
+
+Builds a synthetic ``employees`` table split across N shard files and times a
+set of representative agent queries for every (shard count, worker count)
+combination, against a single unsharded database as the baseline.
+
+Usage:
+    python -m db.bench_federated --rows 2000000 --shards 1 2 4 8 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Any, List, Sequence, Tuple
+
+from db.federated import FederatedSQLDatabase
+
+DEPARTMENTS = ["Sales", "Engineering", "Marketing", "HR", "Finance", "Support"]
+
+BENCH_QUERIES = [
+    "SELECT COUNT(*) FROM employees",
+    "SELECT department, ROUND(AVG(salary), 2) AS avg_salary FROM employees GROUP BY department ORDER BY avg_salary DESC",
+    "SELECT department, MIN(age), MAX(age), SUM(salary) FROM employees WHERE age > 30 GROUP BY department",
+    "SELECT name, salary FROM employees ORDER BY salary DESC, id LIMIT 10",
+]
+
+
+def _generate_rows(count: int, seed: int = 0) -> List[Tuple[Any, ...]]:
+    rng = random.Random(seed)
+    return [
+        (i, f"Employee {i}", rng.randint(21, 65), rng.choice(DEPARTMENTS), float(rng.randint(40, 200) * 1000))
+        for i in range(1, count + 1)
+    ]
+
+
+def _write_db(path: str, rows: Sequence[Tuple[Any, ...]]) -> None:
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+            "age INTEGER, department TEXT, salary REAL)"
+        )
+        conn.executemany("INSERT INTO employees VALUES (?, ?, ?, ?, ?)", rows)
+    conn.close()
+
+
+def _time_queries(db: Any, repeats: int) -> float:
+    """Median wall time in milliseconds to run every benchmark query once."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for query in BENCH_QUERIES:
+            db.run(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run_benchmark(rows: int, shard_counts: Sequence[int], worker_counts: Sequence[int],
+                  executor: str, repeats: int) -> None:
+    data = _generate_rows(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        single_path = os.path.join(tmp, "single.db")
+        _write_db(single_path, data)
+        baseline = FederatedSQLDatabase.from_uris([f"sqlite:///{single_path}"], max_workers=1)
+        expected = [baseline.run(q) for q in BENCH_QUERIES]
+        base_ms = _time_queries(baseline, repeats)
+        baseline.close()
+        print(f"{rows} rows, {executor} pool, {os.cpu_count()} CPUs")
+        print(f"single database: {base_ms:.1f} ms\n")
+        print(f"{'shards':>6} {'workers':>7} {'ms':>10} {'speedup':>8}")
+
+        for shards in shard_counts:
+            uris = []
+            for s in range(shards):
+                path = os.path.join(tmp, f"shard_{shards}_{s}.db")
+                _write_db(path, data[s::shards])
+                uris.append(f"sqlite:///{path}")
+            for workers in worker_counts:
+                db = FederatedSQLDatabase.from_uris(uris, max_workers=workers, executor=executor)
+                if [db.run(q) for q in BENCH_QUERIES] != expected:
+                    raise AssertionError(f"Federated results differ with {shards} shards")
+                elapsed = _time_queries(db, repeats)
+                db.close()
+                print(f"{shards:>6} {workers:>7} {elapsed:>10.1f} {base_ms / elapsed:>7.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.shards, args.workers, args.executor, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+Federated execution over sharded/partitioned databases with an identical schema.
+
+A SELECT is rewritten into a per-shard query, run on every shard in parallel,
+and the partial results are merged by a final query over an in-memory SQLite
+table. Decomposable aggregates (SUM/TOTAL/COUNT/MIN/MAX, AVG via sum+count) are
+combined correctly and ORDER BY/LIMIT is applied after the merge; queries
+without aggregates additionally push a top-k LIMIT down to every shard.
+Shards are assumed to be partitioned on rows only (every shard holds the full
+schema, and joins are local to a shard).
+"""
+import re
+import sqlite3
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, TypedDict
+
+from langchain_community.utilities import SQLDatabase
+from langchain_community.utilities.sql_database import truncate_word
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from db.sql_parsing import IDENTIFIER, mask, split_alias, split_clauses, split_order_term, split_top_level
+
+MERGE_TABLE = "_shards"
+
+# Aggregate name -> (per-shard partial functions, merge expression over the partials)
+DECOMPOSABLE_AGGREGATES = {
+    "SUM": (["SUM"], "SUM({0})"),
+    "TOTAL": (["TOTAL"], "TOTAL({0})"),
+    "COUNT": (["COUNT"], "SUM({0})"),
+    "MIN": (["MIN"], "MIN({0})"),
+    "MAX": (["MAX"], "MAX({0})"),
+    "AVG": (["SUM", "COUNT"], "(CAST(SUM({0}) AS REAL) / SUM({1}))"),
+}
+
+_AGGREGATE_CALL = re.compile(r"\b(SUM|TOTAL|COUNT|MIN|MAX|AVG|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+
+
+class FanoutPlan(TypedDict):
+    """Per-shard and merge queries for a federated SELECT."""
+    shard_sql: str
+    merge_sql: str
+    # Names of the merge table columns, in shard result order. None means the
+    # width is only known at run time (SELECT *): visible columns are named
+    # c0, c1, ... and the trailing ``hidden`` ORDER BY columns h0, h1, ...
+    columns: Optional[List[str]]
+    hidden: int
+
+
+def _normalize(expr: str) -> str:
+    expr = expr.strip()
+    if IDENTIFIER.fullmatch(expr):
+        expr = expr.strip('"`[]')
+    return re.sub(r"\s+", " ", expr).lower()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parse_limit(limit_clause: str) -> Tuple[int, int]:
+    """Parse ``n``, ``n OFFSET m`` or ``m, n`` into (limit, offset)."""
+    match = re.fullmatch(r"(\d+)\s*(?:OFFSET\s+(\d+))?", limit_clause, re.IGNORECASE)
+    if match:
+        return int(match.group(1)), int(match.group(2) or 0)
+    match = re.fullmatch(r"(\d+)\s*,\s*(\d+)", limit_clause)
+    if match:
+        return int(match.group(2)), int(match.group(1))
+    raise ValueError(f"Unsupported LIMIT clause: {limit_clause}")
+
+
+def _extract_aggregates(expr: str, partials: List[str]) -> Tuple[str, bool]:
+    """
+    Replace every aggregate call in ``expr`` by its merge expression over partial
+    columns ``p0``, ``p1``, ...; the per-shard partial expressions are appended
+    to ``partials``. Returns the rewritten expression and whether an aggregate
+    was found.
+    """
+    masked = mask(expr, depth_mask=False)
+    if re.search(r"\bSELECT\b", masked, re.IGNORECASE):
+        raise ValueError("Subqueries cannot be federated")
+    pieces, cursor, found = [], 0, False
+    for match in _AGGREGATE_CALL.finditer(masked):
+        if match.start() < cursor:
+            raise ValueError("Nested aggregates cannot be federated")
+        depth, end = 0, len(masked)
+        for pos in range(match.end() - 1, len(masked)):
+            if masked[pos] == "(":
+                depth += 1
+            elif masked[pos] == ")":
+                depth -= 1
+                if depth == 0:
+                    end = pos
+                    break
+        name = match.group(1).upper()
+        arg = expr[match.end():end].strip()
+        if name in {"MIN", "MAX"} and len(split_top_level(arg)) > 1:
+            continue  # Multi-argument MIN/MAX are scalar functions in SQLite
+        if name not in DECOMPOSABLE_AGGREGATES:
+            raise ValueError(f"Aggregate {name} cannot be federated")
+        if re.match(r"DISTINCT\b", arg, re.IGNORECASE) and name not in {"MIN", "MAX"}:
+            raise ValueError(f"{name}(DISTINCT ...) cannot be federated")
+        if re.match(r"\s*(FILTER|OVER)\b", masked[end + 1:], re.IGNORECASE):
+            raise ValueError("Window and filtered aggregates cannot be federated")
+
+        shard_fns, merge_template = DECOMPOSABLE_AGGREGATES[name]
+        names = []
+        for fn in shard_fns:
+            names.append(f"p{len(partials)}")
+            partials.append(f"{fn}({arg})")
+        pieces.append(expr[cursor:match.start()])
+        pieces.append(merge_template.format(*names))
+        cursor = end + 1
+        found = True
+    pieces.append(expr[cursor:])
+    return "".join(pieces), found
+
+
+def _resolve_group_term(term: str, items: Sequence[Tuple[str, Optional[str]]]) -> str:
+    """Resolve a positional (``GROUP BY 1``) or alias GROUP BY term to its select expression."""
+    key = _normalize(term)
+    if key.isdigit():
+        index = int(key) - 1
+        if not 0 <= index < len(items):
+            raise ValueError(f"GROUP BY term {term!r} is out of range")
+        term = items[index][0]
+    else:
+        term = next((expr for expr, alias in items if alias and _normalize(alias) == key), term)
+    if _AGGREGATE_CALL.search(mask(term, depth_mask=False)):
+        raise ValueError("Grouping by an aggregate cannot be federated")
+    return term
+
+
+def _limit_sql(limit: Optional[int], offset: int) -> str:
+    return "" if limit is None else f" LIMIT {limit} OFFSET {offset}"
+
+
+def plan_fanout(sql: str) -> FanoutPlan:
+    """
+    Rewrite a SELECT statement into a per-shard query and a merge query.
+
+    Raises ValueError for statements whose result cannot be merged correctly
+    (compound selects, subqueries, DISTINCT aggregates, window functions, ...).
+    """
+    sql = sql.strip().rstrip(";").strip()
+    clauses = split_clauses(sql)
+    for clause in ("FROM", "WHERE", "GROUP BY", "ORDER BY"):
+        # A subquery would be evaluated against each shard's rows only
+        if re.search(r"\bSELECT\b", mask(clauses.get(clause, ""), depth_mask=False), re.IGNORECASE):
+            raise ValueError("Subqueries cannot be federated")
+    select_list = clauses["SELECT"]
+    distinct = re.match(r"DISTINCT\b", select_list, re.IGNORECASE) is not None
+    if distinct:
+        select_list = select_list[len("DISTINCT"):].strip()
+    elif re.match(r"ALL\b", select_list, re.IGNORECASE):
+        select_list = select_list[len("ALL"):].strip()
+    items = [split_alias(item) for item in split_top_level(select_list)]
+    order_terms = [split_order_term(t) for t in split_top_level(clauses.get("ORDER BY", ""))]
+    limit, offset = _parse_limit(clauses["LIMIT"]) if "LIMIT" in clauses else (None, 0)
+    source = " FROM " + clauses["FROM"] if "FROM" in clauses else ""
+    if "WHERE" in clauses:
+        source += " WHERE " + clauses["WHERE"]
+
+    partials: List[str] = []
+    merged_items = [_extract_aggregates(expr, partials) for expr, _ in items]
+    having, having_found = _extract_aggregates(clauses.get("HAVING", ""), partials)
+    has_star = any(expr.endswith("*") for expr, _ in items)
+    aliases = {_normalize(alias): i for i, (_, alias) in enumerate(items) if alias}
+    expressions = {_normalize(expr): i for i, (expr, _) in enumerate(items)}
+
+    if not (any(found for _, found in merged_items) or having_found or "GROUP BY" in clauses):
+        # The top-k of the union is contained in the union of every shard's top-k.
+        hidden, merge_order = [], []
+        for expr, direction in order_terms:
+            key = _normalize(expr)
+            if key.isdigit():
+                merge_order.append(f"c{int(key) - 1}{direction}")
+            elif not has_star and key in aliases:
+                merge_order.append(f"c{aliases[key]}{direction}")
+            elif not has_star and key in expressions:
+                merge_order.append(f"c{expressions[key]}{direction}")
+            else:
+                merge_order.append(f"h{len(hidden)}{direction}")
+                hidden.append(expr)
+        if distinct and hidden:
+            raise ValueError("SELECT DISTINCT ordered by unselected columns cannot be federated")
+        shard_sql = "SELECT " + ("DISTINCT " if distinct else "") + select_list
+        shard_sql += "".join(f", {expr} AS _h{i}" for i, expr in enumerate(hidden)) + source
+        if order_terms:
+            shard_sql += " ORDER BY " + clauses["ORDER BY"]
+        if limit is not None:
+            shard_sql += f" LIMIT {limit + offset}"
+        merge_sql = f"SELECT {'DISTINCT ' if distinct else ''}* FROM {MERGE_TABLE}"
+        if merge_order:
+            merge_sql += " ORDER BY " + ", ".join(merge_order)
+        columns = None if has_star else (
+            [f"c{i}" for i in range(len(items))] + [f"h{i}" for i in range(len(hidden))]
+        )
+        return {
+            "shard_sql": shard_sql,
+            "merge_sql": merge_sql + _limit_sql(limit, offset),
+            "columns": columns,
+            "hidden": len(hidden),
+        }
+
+    if has_star:
+        raise ValueError("SELECT * cannot be combined with aggregates in a federated query")
+    if distinct:
+        raise ValueError("SELECT DISTINCT with aggregates cannot be federated")
+
+    group_terms = split_top_level(clauses.get("GROUP BY", ""))
+    # Positions and aliases refer to the original select list, not the shard one
+    group_exprs = [_resolve_group_term(term, items) for term in group_terms]
+    groups = {_normalize(g): j for j, g in enumerate(group_exprs)}
+    groups.update({_normalize(g): j for j, g in enumerate(group_terms) if not _normalize(g).isdigit()})
+    shard_items, columns, merge_items = [], [], []
+    for i, ((expr, alias), (merged, found)) in enumerate(zip(items, merged_items)):
+        if found:
+            merge_items.append(f"{merged} AS {_quote(alias or expr)}")
+        else:
+            shard_items.append(f"{expr} AS c{i}")
+            columns.append(f"c{i}")
+            merge_items.append(f"c{i} AS {_quote(alias or expr)}")
+    for j, group_expr in enumerate(group_exprs):
+        shard_items.append(f"{group_expr} AS k{j}")
+        columns.append(f"k{j}")
+
+    merge_order = []
+    for expr, direction in order_terms:
+        key = _normalize(expr)
+        merged, found = _extract_aggregates(expr, partials)
+        if key.isdigit() or key in aliases:
+            merge_order.append(expr + direction)
+        elif found:
+            merge_order.append(merged + direction)
+        elif key in expressions:
+            merge_order.append(f"c{expressions[key]}{direction}")
+        elif key in groups:
+            merge_order.append(f"k{groups[key]}{direction}")
+        else:
+            raise ValueError(f"Cannot resolve ORDER BY term {expr!r} in a federated query")
+    for j, partial in enumerate(partials):
+        shard_items.append(f"{partial} AS p{j}")
+        columns.append(f"p{j}")
+
+    shard_sql = f"SELECT {', '.join(shard_items)}{source}"
+    merge_sql = f"SELECT {', '.join(merge_items)} FROM {MERGE_TABLE}"
+    if group_exprs:
+        shard_sql += " GROUP BY " + ", ".join(group_exprs)
+        merge_sql += " GROUP BY " + ", ".join(f"k{j}" for j in range(len(group_exprs)))
+    if having.strip():
+        merge_sql += " HAVING " + having
+    if merge_order:
+        merge_sql += " ORDER BY " + ", ".join(merge_order)
+    return {
+        "shard_sql": shard_sql,
+        "merge_sql": merge_sql + _limit_sql(limit, offset),
+        "columns": columns,
+        "hidden": 0,
+    }
+
+
+def merge_shard_rows(
+    plan: FanoutPlan, shard_rows: Sequence[Sequence[Sequence[Any]]]
+) -> List[Tuple[Any, ...]]:
+    """Merge the per-shard results of ``plan["shard_sql"]`` with ``plan["merge_sql"]``."""
+    rows = [tuple(row) for result in shard_rows for row in result]
+    columns = plan["columns"]
+    if columns is None:
+        if not rows:
+            return []
+        visible = len(rows[0]) - plan["hidden"]
+        columns = [f"c{i}" for i in range(visible)] + [f"h{i}" for i in range(plan["hidden"])]
+
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute(f"CREATE TABLE {MERGE_TABLE} ({', '.join(columns)})")
+        conn.executemany(
+            f"INSERT INTO {MERGE_TABLE} VALUES ({', '.join('?' * len(columns))})", rows
+        )
+        merged = conn.execute(plan["merge_sql"]).fetchall()
+    finally:
+        conn.close()
+    if plan["hidden"]:
+        merged = [row[:-plan["hidden"]] for row in merged]
+    return merged
+
+
+_PROCESS_ENGINES: Dict[str, Engine] = {}
+
+
+def _run_on_shard_uri(uri: str, sql: str) -> List[Tuple[Any, ...]]:
+    """Process-pool worker: run ``sql`` on the shard at ``uri`` (engines are cached per process)."""
+    if uri not in _PROCESS_ENGINES:
+        _PROCESS_ENGINES[uri] = create_engine(uri)
+    return _run_on_engine(_PROCESS_ENGINES[uri], sql)
+
+
+def _run_on_engine(engine: Engine, sql: str) -> List[Tuple[Any, ...]]:
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(sql))]
+
+
+class FederatedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that fans every query out to a set of shards with an identical
+    schema. Schema information (``get_table_info``, ``dialect``) comes from the
+    first shard, so the agent and ``QuerySQLDatabaseTool`` work unchanged.
+    """
+
+    def __init__(
+        self,
+        shard_uris: Sequence[str],
+        max_workers: Optional[int] = None,
+        executor: Literal["thread", "process"] = "thread",
+        **kwargs: Any,
+    ):
+        if not shard_uris:
+            raise ValueError("At least one shard URI is required")
+        self._shard_uris = list(shard_uris)
+        self._shard_engines = [create_engine(uri) for uri in self._shard_uris]
+        self._max_workers = max_workers or len(self._shard_uris)
+        self._executor_kind = executor
+        self._pool: Optional[Executor] = None
+        super().__init__(self._shard_engines[0], **kwargs)
+
+    @classmethod
+    def from_uris(cls, shard_uris: Sequence[str], **kwargs: Any) -> "FederatedSQLDatabase":
+        """Construct a federated database from a list of shard URIs."""
+        return cls(shard_uris, **kwargs)
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shard_uris)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            pool_cls = ProcessPoolExecutor if self._executor_kind == "process" else ThreadPoolExecutor
+            self._pool = pool_cls(max_workers=self._max_workers)
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down the worker pool and dispose of the shard engines."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for engine in self._shard_engines:
+            engine.dispose()
+
+    def run_federated(self, command: str) -> List[Tuple[Any, ...]]:
+        """Run ``command`` on every shard in parallel and return the merged rows."""
+        plan = plan_fanout(command)
+        pool = self._get_pool()
+        if self._executor_kind == "process":
+            futures = [pool.submit(_run_on_shard_uri, uri, plan["shard_sql"]) for uri in self._shard_uris]
+        else:
+            futures = [pool.submit(_run_on_engine, engine, plan["shard_sql"]) for engine in self._shard_engines]
+        return merge_shard_rows(plan, [future.result() for future in futures])
+
+    def _column_names(self, command: str) -> List[str]:
+        """Column names of ``command``, resolved on the first shard without scanning rows."""
+        with self._shard_engines[0].connect() as conn:
+            return list(conn.execute(text(f"SELECT * FROM ({command.strip().rstrip(';')}) LIMIT 0")).keys())
+
+    def run(
+        self,
+        command: Any,
+        fetch: Literal["all", "one", "cursor"] = "all",
+        include_columns: bool = False,
+        *,
+        parameters: Optional[Dict[str, Any]] = None,
+        execution_options: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """Execute a SQL command on all shards and return a string of the merged results."""
+        if fetch == "cursor" or parameters or not isinstance(command, str):
+            raise ValueError("Federated execution only supports plain SQL strings")
+        rows = self.run_federated(command)
+        if fetch == "one":
+            rows = rows[:1]
+        res: List[Any] = [
+            tuple(truncate_word(value, length=self._max_string_length) for value in row)
+            for row in rows
+        ]
+        if include_columns:
+            names = self._column_names(command)
+            res = [dict(zip(names, row)) for row in res]
+        if not res:
+            return ""
+        return str(res)
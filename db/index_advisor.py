@@ -0,0 +1,410 @@
+"""
+Index advisor driven by the query log that ``exec_sql`` writes.
+
+Each logged SELECT is parsed for the columns it filters on (equality and range
+predicates, including join conditions), groups and orders by, and reads. Per
+table these become a candidate index: equality columns first (most selective
+first), then GROUP BY / ORDER BY columns, then a range column, then the other
+columns the statement reads so the index covers it. Candidates that are a
+prefix of another candidate or of an existing index are merged away, and the
+rest are weighted by total logged latency (frequency x latency).
+
+The candidates are created inside a transaction, the logged statements are
+re-timed and re-planned with ``EXPLAIN QUERY PLAN``, and a before/after report
+is printed. Without ``--apply`` the transaction is rolled back; with it, the
+indexes the planner actually used are kept. SQLite only.
+
+Usage:
+    python -m db.index_advisor [--apply] [--db employees.db] [--log query_log.jsonl]
+"""
+import argparse
+import re
+import sqlite3
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, TypedDict
+
+from db.query_log import QUERY_LOG_PATH, load_query_log
+from db.setup import DB_PATH
+from db.sql_parsing import IDENTIFIER, mask, split_clauses, split_order_term, split_top_level
+
+MAX_INDEX_COLUMNS = 5
+
+_COLUMN_REF = re.compile(
+    r"(?:(?P<qualifier>" + IDENTIFIER.pattern + r")\s*\.\s*)?(?P<column>" + IDENTIFIER.pattern + r")(?!\s*\()"
+)
+_JOIN = re.compile(
+    r",|\b(?:NATURAL\s+)?(?:(?:LEFT|RIGHT|FULL)(?:\s+OUTER)?\s+|INNER\s+|CROSS\s+)?JOIN\b", re.IGNORECASE
+)
+_COMPARISON = re.compile(r"(==|=|<>|!=|<=|>=|<|>|\bIS\s+NOT\b|\bIS\b|\bNOT\s+IN\b|\bIN\b|\bBETWEEN\b)", re.IGNORECASE)
+_EQUALITY_OPS = {"=", "==", "IS", "IN"}
+_RANGE_OPS = {"<", ">", "<=", ">=", "BETWEEN"}
+
+
+class IndexCandidate(TypedDict):
+    table: str
+    columns: List[str]
+    # Total logged latency (ms) of the statements the index serves
+    weight: float
+    statements: List[str]
+
+
+class TableSchema(TypedDict):
+    columns: List[str]
+    rowid_column: Optional[str]
+    indexes: Dict[str, List[str]]
+
+
+def _unquote(identifier: str) -> str:
+    return identifier.strip('"`[]')
+
+
+def index_name(table: str, columns: Sequence[str]) -> str:
+    """Conventional name for an index on ``table(columns)``."""
+    return f"ix_{table}_{'_'.join(columns)}"
+
+
+def load_schema(conn: sqlite3.Connection) -> Dict[str, TableSchema]:
+    """Columns, rowid alias and existing indexes of every user table, keyed by lower-case name."""
+    schema: Dict[str, TableSchema] = {}
+    tables = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    for (table,) in tables:
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        primary_keys = [row for row in info if row[5]]
+        rowid_column = None
+        if len(primary_keys) == 1 and primary_keys[0][2].upper() == "INTEGER":
+            rowid_column = primary_keys[0][1]
+        indexes = {}
+        for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            indexes[index[1]] = [row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()]
+        schema[table.lower()] = {
+            "columns": [row[1] for row in info],
+            "rowid_column": rowid_column,
+            "indexes": indexes,
+        }
+    return schema
+
+
+class _Usage:
+    """Column usage of one table within one statement."""
+
+    def __init__(self, table: str):
+        self.table = table
+        self.equality: List[str] = []
+        self.ranges: List[str] = []
+        self.group_order: List[str] = []
+        self.read: Set[str] = set()
+        self.select_all = False
+
+    def add(self, bucket: List[str], column: str) -> None:
+        if column not in bucket:
+            bucket.append(column)
+        self.read.add(column)
+
+
+def _parse_from(from_clause: str, schema: Dict[str, TableSchema]) -> Tuple[Dict[str, str], List[str]]:
+    """Map aliases (and table names) to tables, and collect JOIN ... ON conditions."""
+    aliases: Dict[str, str] = {}
+    conditions: List[str] = []
+    masked = mask(from_clause)
+    starts = [0] + [m.end() for m in _JOIN.finditer(masked)]
+    ends = [m.start() for m in _JOIN.finditer(masked)] + [len(from_clause)]
+    for start, end in zip(starts, ends):
+        segment, masked_segment = from_clause[start:end].strip(), masked[start:end].strip()
+        on = re.search(r"\bON\b", masked_segment, re.IGNORECASE)
+        if on:
+            conditions.append(segment[on.end():].strip())
+            segment = segment[:on.start()].strip()
+        segment = re.split(r"\bUSING\b", segment, flags=re.IGNORECASE)[0].strip()
+        if not segment or segment.startswith("("):
+            continue
+        parts = re.split(r"\s+(?:AS\s+)?", segment, flags=re.IGNORECASE)
+        table = _unquote(parts[0]).lower()
+        if table in schema:
+            aliases[table] = table
+            if len(parts) > 1 and IDENTIFIER.fullmatch(parts[-1]):
+                aliases[_unquote(parts[-1]).lower()] = table
+    return aliases, conditions
+
+
+def _conjuncts(condition: str) -> List[str]:
+    """Split a condition on top-level AND, keeping ``BETWEEN x AND y`` together."""
+    masked = mask(condition)
+    pieces, start, pending_between = [], 0, False
+    for match in re.finditer(r"\bBETWEEN\b|\bAND\b", masked, re.IGNORECASE):
+        if match.group(0).upper() == "BETWEEN":
+            pending_between = True
+        elif pending_between:
+            pending_between = False
+        else:
+            pieces.append(condition[start:match.start()].strip())
+            start = match.end()
+    pieces.append(condition[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+class _StatementAnalyzer:
+    def __init__(self, sql: str, schema: Dict[str, TableSchema]):
+        self.schema = schema
+        clauses = split_clauses(sql)
+        if len(re.findall(r"\bSELECT\b", mask(sql, depth_mask=False), re.IGNORECASE)) > 1 or "FROM" not in clauses:
+            raise ValueError("Subqueries are not supported")
+        self.aliases, join_conditions = _parse_from(clauses["FROM"], schema)
+        self.usages = {table: _Usage(table) for table in set(self.aliases.values())}
+        for condition in join_conditions + ([clauses["WHERE"]] if "WHERE" in clauses else []):
+            for conjunct in _conjuncts(condition):
+                self._predicate(conjunct)
+        for item in split_top_level(clauses.get("GROUP BY", "")):
+            self._group_order(item)
+        for item in split_top_level(clauses.get("ORDER BY", "")):
+            self._group_order(split_order_term(item)[0])
+        for item in split_top_level(clauses["SELECT"]):
+            if re.fullmatch(r"(?:\w+\s*\.\s*)?\*", item.strip()):
+                for usage in self.usages.values():
+                    usage.select_all = True
+            self._read(item)
+        self._read(clauses.get("HAVING", ""))
+
+    def _resolve(self, qualifier: Optional[str], column: str) -> Optional[Tuple[str, str]]:
+        column = _unquote(column)
+        if qualifier:
+            tables = [self.aliases.get(_unquote(qualifier).lower())]
+        else:
+            tables = list(self.usages)
+        for table in tables:
+            if table is None:
+                continue
+            for name in self.schema[table]["columns"]:
+                if name.lower() == column.lower():
+                    return table, name
+        return None
+
+    def _references(self, expression: str) -> List[Tuple[str, str]]:
+        # String literals could contain anything that looks like a column name
+        expression = re.sub(r"'(?:[^']|'')*'", "''", expression)
+        refs = []
+        for match in _COLUMN_REF.finditer(expression):
+            ref = self._resolve(match.group("qualifier"), match.group("column"))
+            if ref and ref not in refs:
+                refs.append(ref)
+        return refs
+
+    def _single_column(self, expression: str) -> Optional[Tuple[str, str]]:
+        match = _COLUMN_REF.fullmatch(expression.strip())
+        return self._resolve(match.group("qualifier"), match.group("column")) if match else None
+
+    def _read(self, expression: str) -> None:
+        for table, column in self._references(expression):
+            self.usages[table].read.add(column)
+
+    def _predicate(self, conjunct: str) -> None:
+        self._read(conjunct)
+        masked = mask(conjunct)
+        if re.search(r"\bOR\b|^\s*NOT\b", masked, re.IGNORECASE):
+            return
+        match = _COMPARISON.search(masked)
+        if not match:
+            return
+        op = " ".join(match.group(1).upper().split())
+        left, right = conjunct[:match.start()], conjunct[match.end():]
+        if op == "BETWEEN":
+            right = ""
+        left_ref, right_ref = self._single_column(left), self._single_column(right) if right else None
+        if not left_ref and right_ref and op in {"<", ">", "<=", ">="}:
+            # "50000 < salary" is "salary > 50000"
+            left_ref, right_ref = right_ref, None
+        for ref in (left_ref, right_ref):
+            if ref is None:
+                continue
+            usage = self.usages[ref[0]]
+            if op in _EQUALITY_OPS:
+                usage.add(usage.equality, ref[1])
+            elif op in _RANGE_OPS:
+                usage.add(usage.ranges, ref[1])
+
+    def _group_order(self, expression: str) -> None:
+        ref = self._single_column(expression)
+        if ref is None:
+            # Sorting on an expression or alias cannot be served by a column index
+            self._read(expression)
+            return
+        usage = self.usages[ref[0]]
+        usage.add(usage.group_order, ref[1])
+
+
+class IndexAdvisor:
+    """Propose covering indexes for the statements in a query log."""
+
+    def __init__(self, conn: sqlite3.Connection, max_columns: int = MAX_INDEX_COLUMNS):
+        self.conn = conn
+        self.max_columns = max_columns
+        self.schema = load_schema(conn)
+        self._distinct: Dict[Tuple[str, str], int] = {}
+
+    def _distinct_count(self, table: str, column: str) -> int:
+        key = (table, column)
+        if key not in self._distinct:
+            self._distinct[key] = self.conn.execute(f'SELECT COUNT(DISTINCT "{column}") FROM "{table}"').fetchone()[0]
+        return self._distinct[key]
+
+    def _index_columns(self, usage: _Usage) -> Optional[List[str]]:
+        equality = list(usage.equality)
+        equality.sort(key=lambda column: -self._distinct_count(usage.table, column))
+        group_order = [c for c in usage.group_order if c not in equality]
+        ranges = [c for c in usage.ranges if c not in equality and c not in group_order][:1]
+        columns = (equality + group_order + ranges)[:self.max_columns]
+        rowid_column = self.schema[usage.table]["rowid_column"]
+        if not columns or columns[0] == rowid_column:
+            # Nothing to seek on, or the table is already keyed by it
+            return None
+        if not usage.select_all:
+            covering = sorted(c for c in usage.read if c not in columns and c != rowid_column)
+            if len(columns) + len(covering) <= self.max_columns:
+                columns += covering
+        return columns
+
+    def analyze(self, entries: Sequence[Dict[str, Any]]) -> List[IndexCandidate]:
+        """Turn logged statements into merged candidates, heaviest first."""
+        by_statement: Dict[str, List[float]] = defaultdict(list)
+        for entry in entries:
+            by_statement[" ".join(str(entry.get("sql", "")).split()).rstrip(";")].append(
+                float(entry.get("elapsed_ms", 0.0))
+            )
+        candidates: Dict[Tuple[str, Tuple[str, ...]], IndexCandidate] = {}
+        for sql, latencies in by_statement.items():
+            try:
+                analyzer = _StatementAnalyzer(sql, self.schema)
+            except ValueError:
+                continue
+            for usage in analyzer.usages.values():
+                columns = self._index_columns(usage)
+                if not columns:
+                    continue
+                key = (usage.table, tuple(columns))
+                candidate = candidates.setdefault(
+                    key, {"table": usage.table, "columns": columns, "weight": 0.0, "statements": []}
+                )
+                candidate["weight"] += sum(latencies)
+                candidate["statements"].append(sql)
+        return self._merge(list(candidates.values()))
+
+    def _merge(self, candidates: List[IndexCandidate]) -> List[IndexCandidate]:
+        def is_prefix(short: Sequence[str], long: Sequence[str]) -> bool:
+            return len(short) <= len(long) and [c.lower() for c in long[:len(short)]] == [c.lower() for c in short]
+
+        # Longest first, so shorter candidates fold into an index that serves them too
+        candidates.sort(key=lambda candidate: -len(candidate["columns"]))
+        merged: List[IndexCandidate] = []
+        for candidate in candidates:
+            existing = self.schema[candidate["table"]]["indexes"].values()
+            if any(is_prefix(candidate["columns"], columns) for columns in existing):
+                continue
+            target = next(
+                (m for m in merged if m["table"] == candidate["table"] and is_prefix(candidate["columns"], m["columns"])),
+                None,
+            )
+            if target is None:
+                merged.append(candidate)
+            else:
+                target["weight"] += candidate["weight"]
+                target["statements"] += candidate["statements"]
+        return sorted(merged, key=lambda candidate: -candidate["weight"])
+
+
+def create_index_sql(candidate: IndexCandidate) -> str:
+    columns = ", ".join(f'"{column}"' for column in candidate["columns"])
+    return f'CREATE INDEX {index_name(candidate["table"], candidate["columns"])} ON "{candidate["table"]}" ({columns})'
+
+
+def _median_ms(conn: sqlite3.Connection, sql: str, repeats: int) -> float:
+    conn.execute(sql).fetchall()  # warm the page cache
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _plan(conn: sqlite3.Connection, sql: str) -> str:
+    return "; ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall())
+
+
+def evaluate_candidates(
+    conn: sqlite3.Connection,
+    candidates: Sequence[IndexCandidate],
+    apply: bool = False,
+    repeats: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Create the candidates, re-time and re-plan the statements they serve, and
+    roll back (or, with ``apply``, commit the indexes the planner used).
+    Returns one report row per statement.
+    """
+    statements = list(dict.fromkeys(sql for candidate in candidates for sql in candidate["statements"]))
+    report = [
+        {"sql": sql, "before_ms": _median_ms(conn, sql, repeats), "plan_before": _plan(conn, sql)}
+        for sql in statements
+    ]
+    conn.execute("BEGIN")
+    try:
+        for candidate in candidates:
+            conn.execute(create_index_sql(candidate))
+        conn.execute("ANALYZE")
+        for row in report:
+            row["after_ms"] = _median_ms(conn, row["sql"], repeats)
+            row["plan_after"] = _plan(conn, row["sql"])
+        if apply:
+            for candidate in candidates:
+                name = index_name(candidate["table"], candidate["columns"])
+                if not any(re.search(rf"\b{name}\b", row["plan_after"]) for row in report):
+                    conn.execute(f"DROP INDEX {name}")
+            conn.execute("COMMIT")
+        else:
+            conn.execute("ROLLBACK")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Propose indexes for the statements in the query log.")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--log", default=str(QUERY_LOG_PATH))
+    parser.add_argument("--apply", action="store_true", help="Keep the indexes the planner used")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Maximum number of indexes to propose")
+    args = parser.parse_args()
+
+    entries = load_query_log(args.log)
+    if not entries:
+        print(f"No statements logged in {args.log}; run some questions through the agent first.")
+        return
+    # Autocommit mode, so the evaluation transaction is explicit
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        candidates = IndexAdvisor(conn).analyze(entries)[:args.top]
+        if not candidates:
+            print(f"{len(entries)} logged statements; no new indexes would help.")
+            return
+        print(f"{len(entries)} logged statements; proposed indexes:\n")
+        for candidate in candidates:
+            print(f"  {create_index_sql(candidate)};  -- {candidate['weight']:.1f} ms logged")
+        report = evaluate_candidates(conn, candidates, apply=args.apply, repeats=args.repeats)
+    finally:
+        conn.close()
+
+    print(f"\n{'before ms':>10} {'after ms':>10} {'speedup':>8}  statement")
+    for row in report:
+        speedup = row["before_ms"] / row["after_ms"] if row["after_ms"] else float("inf")
+        print(f"{row['before_ms']:>10.2f} {row['after_ms']:>10.2f} {speedup:>7.1f}x  {row['sql']}")
+        print(f"{'':>32}plan: {row['plan_before']}  ->  {row['plan_after']}")
+    print("\nIndexes used by the planner were kept." if args.apply else "\nRolled back; rerun with --apply to keep them.")
+
+
+if __name__ == "__main__":
+    main()
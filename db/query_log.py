@@ -0,0 +1,28 @@
+"""Append-only log of the SQL statements the agent executed, used by the index advisor."""
+import json
+import pathlib
+import time
+from typing import Any, Dict, List
+
+QUERY_LOG_PATH = pathlib.Path(__file__).parent.parent / "query_log.jsonl"
+
+
+def record_query(sql: str, elapsed_ms: float, path: pathlib.Path = QUERY_LOG_PATH) -> None:
+    """Append an executed statement and its latency to the query log."""
+    entry = {"sql": sql, "elapsed_ms": round(elapsed_ms, 3), "ts": time.time()}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_query_log(path: pathlib.Path = QUERY_LOG_PATH) -> List[Dict[str, Any]]:
+    """Read all logged statements, skipping malformed lines."""
+    if not pathlib.Path(path).exists():
+        return []
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
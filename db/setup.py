@@ -13,22 +13,22 @@ SAMPLE_ROWS: list[tuple[Any, ...]] = [
     (5, "Charlie Brown", 25, "Engineering", 65000),
 ]
 
+EMPLOYEES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER,
+    department TEXT,
+    salary REAL
+);
+"""
+
 def init_sample_db() -> None:
     if DB_PATH.exists():
         return
     conn = sqlite3.connect(DB_PATH)
     with conn:
-        conn.execute(
-            """
-            CREATE TABLE employees (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                age INTEGER,
-                department TEXT,
-                salary REAL
-            );
-            """
-        )
+        conn.execute(EMPLOYEES_SCHEMA)
         conn.executemany(
             "INSERT INTO employees (id, name, age, department, salary) VALUES (?, ?, ?, ?, ?);",
             SAMPLE_ROWS,
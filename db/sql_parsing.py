@@ -0,0 +1,97 @@
+"""
+Lightweight helpers for taking apart single SELECT statements: masking quoted
+text and parentheses, and splitting top-level clauses, lists and aliases.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*|\"[^\"]*\"|`[^`]*`|\[[^\]]*\]")
+CLAUSES = ["FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+
+
+def mask(sql: str, depth_mask: bool = True) -> str:
+    """
+    Return a same-length copy of ``sql`` with quoted text (and, if ``depth_mask``
+    is set, the contents of parentheses) blanked out, so keywords and commas can
+    be located at the top level with plain regexes.
+    """
+    closing = {"'": "'", '"': '"', "`": "`", "[": "]"}
+    out = []
+    quote = None
+    depth = 0
+    for ch in sql:
+        if quote:
+            out.append(" ")
+            if ch == quote:
+                quote = None
+        elif ch in closing:
+            quote = closing[ch]
+            out.append(" ")
+        elif ch == "(":
+            out.append(" " if depth_mask and depth > 0 else ch)
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            out.append(" " if depth_mask and depth > 0 else ch)
+        else:
+            out.append(" " if depth_mask and depth > 0 else ch)
+    return "".join(out)
+
+
+def split_top_level(sql: str) -> List[str]:
+    """Split ``sql`` on commas that are not inside quotes or parentheses."""
+    parts, start = [], 0
+    for match in re.finditer(",", mask(sql)):
+        parts.append(sql[start:match.start()].strip())
+        start = match.end()
+    parts.append(sql[start:].strip())
+    return [p for p in parts if p]
+
+
+def split_alias(item: str) -> Tuple[str, Optional[str]]:
+    """Split a select item into (expression, alias)."""
+    masked = mask(item)
+    as_matches = list(re.finditer(r"\s+AS\s", masked, re.IGNORECASE))
+    if as_matches:
+        alias = item[as_matches[-1].end():].strip()
+        if IDENTIFIER.fullmatch(alias):
+            return item[:as_matches[-1].start()].strip(), alias.strip('"`[]')
+    match = re.search(r"[\w)\]\"'`]\s+([A-Za-z_]\w*)\s*$", masked)
+    if match and match.group(1).upper() not in {"END", "NULL", "DISTINCT"}:
+        return item[:match.start(1)].strip(), match.group(1)
+    return item.strip(), None
+
+
+def split_clauses(sql: str) -> Dict[str, str]:
+    """Split a single SELECT statement into its top-level clauses."""
+    masked = mask(sql)
+    if re.search(r"\b(UNION|INTERSECT|EXCEPT)\b", masked, re.IGNORECASE):
+        raise ValueError("Compound SELECT statements are not supported")
+    select_match = re.match(r"\s*SELECT\b", masked, re.IGNORECASE)
+    if not select_match:
+        raise ValueError("Only plain SELECT statements are supported")
+
+    positions = []
+    for clause in CLAUSES:
+        match = re.search(r"\b" + clause.replace(" ", r"\s+") + r"\b", masked, re.IGNORECASE)
+        if match:
+            positions.append((match.start(), match.end(), clause))
+    positions.sort()
+
+    clauses = {"SELECT": sql[select_match.end():positions[0][0] if positions else len(sql)].strip()}
+    for i, (_start, end, clause) in enumerate(positions):
+        stop = positions[i + 1][0] if i + 1 < len(positions) else len(sql)
+        clauses[clause] = sql[end:stop].strip()
+    return clauses
+
+
+def split_order_term(term: str) -> Tuple[str, str]:
+    """Split an ORDER BY term into (expression, direction suffix)."""
+    match = re.search(
+        r"\s((?:ASC|DESC)(?:\s+NULLS\s+(?:FIRST|LAST))?|NULLS\s+(?:FIRST|LAST))\s*$",
+        mask(term),
+        re.IGNORECASE,
+    )
+    if match is None:
+        return term.strip(), ""
+    return term[:match.start(1)].strip(), " " + term[match.start(1):].strip()
@@ -2,11 +2,17 @@
 Main CLI entrypoint for LangGraph SQL Q&A agent with memory.
 Supports GPT-4o (OpenAI) and Gemini-2.0-flash (Google).
 """
+import os
 import sys
 from dotenv import load_dotenv
 from langchain_community.utilities import SQLDatabase
 from db.setup import DB_URI, init_sample_db
+from db.query_log import QUERY_LOG_PATH
+from db.federated import FederatedSQLDatabase
+from agents.answer_templates import TemplatedAnswerer
 from agents.chat_sql_agent import build_agent
+from agents.example_store import ExampleStore
+from agents.speculation import SpeculativeEngine
 from llm.loader import choose_llm
 from cli.runner import run_cli
 
@@ -14,9 +20,26 @@ def main():
     load_dotenv()
     init_sample_db()
     model_name, llm = choose_llm()
-    db = SQLDatabase.from_uri(DB_URI)
-    agent_app = build_agent(db, llm)
-    run_cli(model_name, agent_app)
+    # Comma-separated shard URIs with an identical schema enable federated execution
+    shard_uris = [uri.strip() for uri in os.getenv("SQL_SHARD_URIS", "").split(",") if uri.strip()]
+    if shard_uris:
+        db = FederatedSQLDatabase.from_uris(shard_uris)
+    else:
+        db = SQLDatabase.from_uri(DB_URI)
+    # Few-shot examples verified in earlier sessions; FEW_SHOT_EXAMPLES=0 disables them
+    example_store = ExampleStore() if os.getenv("FEW_SHOT_EXAMPLES", "1") != "0" else None
+    # SPECULATE=1 precomputes likely follow-ups while the user reads each answer
+    speculation = SpeculativeEngine(db, llm, example_store) if os.getenv("SPECULATE") == "1" else None
+    # Executed SQL is logged for `python -m db.index_advisor`; QUERY_LOG=0 disables it
+    query_log = QUERY_LOG_PATH if os.getenv("QUERY_LOG", "1") != "0" else None
+    # Simple results are answered from templates; TEMPLATED_ANSWERS=0 always asks the LLM
+    answerer = None
+    if os.getenv("TEMPLATED_ANSWERS", "1") != "0":
+        answerer = TemplatedAnswerer(max_rows=int(os.getenv("TEMPLATED_ANSWER_MAX_ROWS", "5")))
+    agent_app = build_agent(
+        db, llm, example_store, speculation=speculation, query_log=query_log, answerer=answerer
+    )
+    run_cli(model_name, agent_app, speculation, answerer)
 
 if __name__ == "__main__":
     main()
@@ -22,4 +22,10 @@ SQL_GEN_PROMPT = PromptTemplate(
     input_variables=["schema", "history", "question"],
 )
 
-
+# Likely follow-ups that are answered speculatively while the user reads the previous
+# answer: (what the user would type, self-contained question used to generate the SQL).
+# {question} is the previous question and {column} a text column of the schema.
+DRILL_DOWN_TEMPLATES = [
+    ("Break it down by {column}", "{question} Break the result down by {column}."),
+    ("Show the top 5", "{question} Show only the top 5 rows."),
+]
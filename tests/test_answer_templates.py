@@ -0,0 +1,75 @@
+"""Templated answers must be correct or fall back to the LLM (None)."""
+import pytest
+
+from agents.answer_templates import TemplatedAnswerer
+
+
+def _answer(question, sql, result):
+    return TemplatedAnswerer().answer(question, sql, {"result": result})
+
+
+@pytest.mark.parametrize("question, sql, result, expected", [
+    ("How many employees are there?", "SELECT COUNT(*) FROM employees", "[(5,)]", "There are 5 employees."),
+    (
+        "Are there any employees in HR?",
+        "SELECT COUNT(*) FROM employees WHERE department = 'HR'",
+        "[(0,)]",
+        "No, there are no employees whose department is HR.",
+    ),
+    (
+        "Is there an employee named Bob?",
+        "SELECT COUNT(*) FROM employees WHERE name = 'Bob'",
+        "[(1,)]",
+        "Yes, there is 1 employee whose name is Bob.",
+    ),
+    ("Any employees in Legal?", "SELECT name FROM employees WHERE department = 'Legal'", "", "No, no matching employees were found."),
+    ("Who works in Legal?", "SELECT name FROM employees WHERE department = 'Legal'", "", "No matching employees were found."),
+    ("What is the average salary?", "SELECT ROUND(AVG(salary), 2) FROM employees", "[(5.5,)]", "The average salary is 5.5."),
+    (
+        "How many employees per department?",
+        "SELECT department, COUNT(*) FROM employees GROUP BY department",
+        "[('HR', 2), ('Sales', 3)]",
+        "The number of employees by department is: HR 2 and Sales 3.",
+    ),
+    (
+        "Average salary per department?",
+        "SELECT department AS dept, AVG(salary) FROM employees GROUP BY 1",
+        "[('HR', 50000.0)]",
+        "The average salary by dept is: HR 50,000.",
+    ),
+    (
+        "Headcount by department?",
+        "SELECT e.department, COUNT(*) FROM employees e GROUP BY e.department",
+        "[('HR', 2), ('Sales', 3)]",
+        "The number of employees by department is: HR 2 and Sales 3.",
+    ),
+    ("Who earns the most?", "SELECT name FROM employees ORDER BY salary DESC LIMIT 1", "[('Bob',)]", "Bob has the highest salary."),
+])
+def test_templated(question, sql, result, expected):
+    assert _answer(question, sql, result) == expected
+
+
+@pytest.mark.parametrize("question, sql, result", [
+    # Yes/no questions whose answer does not follow from "are there rows"
+    ("Is the number of employees greater than 10?", "SELECT COUNT(*) FROM employees", "[(5,)]"),
+    ("Are all employees older than 20?", "SELECT COUNT(*) FROM employees WHERE age <= 20", "[(0,)]"),
+    ("Do we have fewer than 3 engineers?", "SELECT COUNT(*) FROM employees WHERE department = 'Engineering'", "[(2,)]"),
+    ("Are all employees paid above 50000?", "SELECT name FROM employees WHERE salary <= 50000", ""),
+    ("Are there more than 3 engineers?", "SELECT COUNT(*) FROM employees WHERE department = 'Engineering'", "[(2,)]"),
+    ("Does Bob earn more than 50k?", "SELECT MAX(salary) FROM employees", "[(60000,)]"),
+    # Shapes that cannot be described reliably
+    ("How many are missing?", "SELECT COUNT(*) - COUNT(salary) FROM employees", "[(2,)]"),
+    ("Who is second?", "SELECT name FROM employees ORDER BY salary DESC LIMIT 1 OFFSET 1", "[('Bob',)]"),
+    ("Who is second?", "SELECT name FROM employees ORDER BY salary DESC LIMIT 1, 1", "[('Bob',)]"),
+    ("How many per department?", "SELECT COUNT(*) FROM employees GROUP BY department", "[(2,), (3,)]"),
+    (
+        "How many per department?",
+        "SELECT e.department, COUNT(*) FROM employees e JOIN offices o ON o.id = e.office_id "
+        "WHERE o.city = 'Paris' GROUP BY e.department",
+        "[('Sales', 2)]",
+    ),
+    ("How many?", "SELECT COUNT(*) FROM employees, offices", "[(10,)]"),
+    ("Broken", "SELECT COUNT(*) FROM employees", "Error: no such table: employees"),
+])
+def test_falls_back(question, sql, result):
+    assert _answer(question, sql, result) is None
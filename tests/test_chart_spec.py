@@ -0,0 +1,85 @@
+"""Local parsing and repair of LLM chart specs."""
+import json
+
+import pytest
+
+from visualization.chart_spec import normalize_chart_spec, parse_chart_spec, parse_tolerant_json
+
+SPEC = {"type": "bar", "data": {"labels": ["a", "b"], "datasets": [{"label": "n", "data": [1, 2]}]}}
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(SPEC),
+    "```json\n" + json.dumps(SPEC) + "\n```",
+    "Here is the chart:\n" + json.dumps(SPEC) + "\nLet me know if you need changes.",
+])
+def test_clean_responses_need_no_repairs(text):
+    assert parse_tolerant_json(text) == (SPEC, [])
+
+
+@pytest.mark.parametrize("text, value, repair", [
+    ('{"a": 1,}', {"a": 1}, "trailing comma"),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}, "missing comma"),
+    ('{"a": 1, // note\n"b": 2}', {"a": 1, "b": 2}, "comments"),
+    ("{'a': True, 'b': None}", {"a": True, "b": None}, "single quotes"),
+])
+def test_repairs_are_named(text, value, repair):
+    parsed, repairs = parse_tolerant_json(text)
+    assert parsed == value
+    assert repair in repairs
+
+
+def test_truncated_output_keeps_complete_members():
+    parsed, repairs = parse_tolerant_json('{"labels": ["a", "b"], "data": [1, 2, 3')
+    assert parsed["labels"] == ["a", "b"]
+    assert repairs
+
+
+def test_no_object_is_an_error():
+    with pytest.raises(ValueError):
+        parse_tolerant_json("I cannot draw that.")
+
+
+@pytest.mark.parametrize("title", ["Salaries", 42, ["Salaries"], None])
+def test_plugin_title_of_any_shape(title):
+    spec = {**SPEC, "options": {"plugins": {"title": title}}}
+    normalized, repairs = normalize_chart_spec(spec)
+    assert isinstance(normalized["options"]["title"]["text"], str)
+    assert repairs == []
+
+
+def test_plugin_title_text_is_used():
+    spec = {**SPEC, "options": {"plugins": {"title": {"text": "Salaries"}}}}
+    assert normalize_chart_spec(spec)[0]["options"]["title"] == {"text": "Salaries"}
+
+
+def test_string_title_is_a_repair():
+    normalized, repairs = normalize_chart_spec({**SPEC, "options": {"title": "Salaries"}})
+    assert normalized["options"]["title"] == {"text": "Salaries"}
+    assert repairs == ["string title"]
+
+
+def test_flat_spec_without_datasets():
+    normalized, repairs = normalize_chart_spec({"labels": ["a", "b"], "data": ["1", "$2,000"]}, chart_type="pie")
+    assert normalized["type"] == "pie"
+    assert normalized["datasets"][0]["data"] == [1, 2000]
+    assert {"missing type", "missing datasets", "non-numeric values"} <= set(repairs)
+
+
+def test_length_mismatch_keeps_aligned_prefix():
+    spec = {"type": "line", "data": {"labels": ["a", "b", "c"], "datasets": [{"data": [1, 2]}]}}
+    normalized, repairs = normalize_chart_spec(spec)
+    assert normalized["data"]["labels"] == ["a", "b"]
+    assert "length mismatch" in repairs
+
+
+@pytest.mark.parametrize("spec", [{"type": "bar"}, {"type": "bar", "data": {"datasets": [{"data": ["x"]}]}}, "bar"])
+def test_unchartable_specs_are_errors(spec):
+    with pytest.raises(ValueError):
+        normalize_chart_spec(spec)
+
+
+def test_parse_chart_spec_combines_repairs():
+    spec, repairs = parse_chart_spec("```\n{'labels': ['a'], 'datasets': [{'data': [1]}],}\n```")
+    assert spec["datasets"][0]["data"] == [1]
+    assert "trailing comma" in repairs and "missing type" in repairs
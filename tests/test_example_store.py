@@ -0,0 +1,56 @@
+"""The incrementally updated index must rank like a TF-IDF model rebuilt from scratch."""
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from agents.example_store import ExampleStore, _features
+
+WORDS = "employee salary department average count engineering sales hr highest lowest total age name hired per by".split()
+
+
+def _question(rng):
+    return " ".join(rng.choice(WORDS) + rng.choice(["", "s"]) for _ in range(rng.randint(2, 7))) + f" {rng.randint(0, 99)}"
+
+
+def _reference_scores(store, question):
+    docs = [_features(example["question"]) for example in store._examples]
+    df = Counter()
+    for doc in docs:
+        df.update(doc.keys())
+    idf = {term: math.log((1 + len(docs)) / (1 + df[term])) + 1 for term in df}
+
+    def vector(features):
+        return {term: (1 + math.log(count)) * idf[term] for term, count in features.items() if term in idf}
+
+    query = vector(_features(question))
+    query_norm = math.sqrt(sum(v * v for v in query.values()))
+    scores = []
+    for doc in docs:
+        weights = vector(doc)
+        norm = math.sqrt(sum(v * v for v in weights.values()))
+        dot = sum(query.get(term, 0) * v for term, v in weights.items())
+        scores.append(dot / (norm * query_norm) if norm and query_norm else 0.0)
+    return sorted(scores, reverse=True)
+
+
+def test_matches_rebuilt_index_across_evictions():
+    rng = random.Random(0)
+    store = ExampleStore(path=None, k=5, min_score=0.0, max_examples=50)
+    for i in range(400):
+        store.add(_question(rng), f"SELECT {i}")
+        if i % 13 == 0:
+            probe = _question(rng)
+            scores = [score for score, _example in store.search(probe)]
+            assert scores == pytest.approx(_reference_scores(store, probe)[:5], abs=1e-5)
+    assert len(store) == 50
+
+
+def test_search_finds_the_closest_example():
+    store = ExampleStore(path=None)
+    store.add("What is the average salary by department?", "SELECT department, AVG(salary) FROM employees GROUP BY 1")
+    store.add("How many employees are there?", "SELECT COUNT(*) FROM employees")
+    [(_score, example)] = store.search("average salaries per department", k=1)
+    assert example["sql"].startswith("SELECT department, AVG")
+    assert store.search("zzz") == []
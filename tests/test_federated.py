@@ -0,0 +1,61 @@
+"""Federated results must match the same query on a single, unsharded database."""
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from db.federated import FederatedSQLDatabase, plan_fanout
+
+ROWS = [
+    (i, f"Employee {i}", 21 + i % 40, ["Sales", "Engineering", "Marketing", "HR"][i % 4], float(40000 + (i * 7919) % 90000))
+    for i in range(1, 301)
+]
+SHARDS = 3
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    root = tmp_path_factory.mktemp("shards")
+    paths = [root / "single.db"] + [root / f"shard{i}.db" for i in range(SHARDS)]
+    for index, path in enumerate(paths):
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, age INTEGER, department TEXT, salary REAL)"
+        )
+        rows = ROWS if index == 0 else ROWS[index - 1::SHARDS]
+        conn.executemany("INSERT INTO employees VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+    single = sqlite3.connect(paths[0])
+    federated = FederatedSQLDatabase.from_uris([f"sqlite:///{path}" for path in paths[1:]])
+    yield single, federated
+    single.close()
+    federated.close()
+
+
+def _rows(rows):
+    return Counter(tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT department, COUNT(*) FROM employees GROUP BY 1",
+    "SELECT department AS d, AVG(salary) FROM employees GROUP BY d",
+    "SELECT department AS d, SUM(salary) AS total FROM employees GROUP BY d ORDER BY total DESC LIMIT 2",
+    "SELECT department, age > 40, COUNT(*) FROM employees GROUP BY 1, 2 ORDER BY 1, 2",
+    "SELECT COUNT(*), MIN(age), MAX(salary) FROM employees WHERE department = 'Sales'",
+    "SELECT name, salary FROM employees ORDER BY salary DESC, id LIMIT 5",
+])
+def test_matches_single_database(databases, sql):
+    single, federated = databases
+    assert _rows(federated.run_federated(sql)) == _rows(single.execute(sql).fetchall())
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM employees WHERE salary = (SELECT MAX(salary) FROM employees)",
+    "SELECT name FROM employees WHERE id IN (SELECT id FROM employees WHERE age > 50)",
+    "SELECT COUNT(*) FROM (SELECT department FROM employees GROUP BY department)",
+    "SELECT department, COUNT(*) FROM employees GROUP BY 2",
+])
+def test_rejects_shard_local_semantics(sql):
+    with pytest.raises(ValueError):
+        plan_fanout(sql)
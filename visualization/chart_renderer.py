@@ -5,6 +5,10 @@ import os
 import json
 import uuid
 import re
+import threading
+import matplotlib
+# Charts are only written to files, so use the non-GUI backend (safe off the main thread)
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 from typing import Dict, Any, Optional, List, Union, Tuple
@@ -13,6 +17,9 @@ from typing import Dict, Any, Optional, List, Union, Tuple
 VISUALIZATION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "visualizations")
 os.makedirs(VISUALIZATION_DIR, exist_ok=True)
 
+# pyplot keeps global state, so renders from different threads are serialized
+_RENDER_LOCK = threading.Lock()
+
 def hex_to_rgba(color_str: str, alpha: float = 1.0) -> Union[Tuple[float, float, float, float], str]:
     """Convert color string to RGBA tuple."""
     try:
@@ -42,9 +49,10 @@ def hex_to_rgba(color_str: str, alpha: float = 1.0) -> Union[Tuple[float, float,
         print(f"Warning: Could not convert color '{color_str}' to RGBA, using default color")
         return mcolors.to_rgba("#36a2eb", alpha)
 
-def render_chart(chart_json: str) -> Optional[str]:
+def render_chart(chart_json: str, dpi: int = 300, output_dir: Optional[str] = None) -> Optional[str]:
     """
-    Render a chart from a JSON specification and save it to the file system.
+    Render a chart from a JSON specification and save it to ``output_dir``
+    (the visualizations directory by default).
     Returns the path to the saved image file, or None if rendering fails.
     """
     try:
@@ -71,26 +79,27 @@ def render_chart(chart_json: str) -> Optional[str]:
             datasets = chart_spec.get("datasets", [])
             title = chart_spec.get("title", "Chart")
         
-        # Create figure and axis
-        plt.figure(figsize=(10, 6))
-        ax = plt.subplot(111)
+        with _RENDER_LOCK:
+            # Create figure and axis
+            plt.figure(figsize=(10, 6))
+            ax = plt.subplot(111)
         
-        # Render different chart types
-        if chart_type.lower() == "pie":
-            render_pie_chart(ax, labels, datasets, title)
-        elif chart_type.lower() == "line":
-            render_line_chart(ax, labels, datasets, title)
-        else:  # Default to bar chart
-            render_bar_chart(ax, labels, datasets, title)
+            # Render different chart types
+            if chart_type.lower() == "pie":
+                render_pie_chart(ax, labels, datasets, title)
+            elif chart_type.lower() == "line":
+                render_line_chart(ax, labels, datasets, title)
+            else:  # Default to bar chart
+                render_bar_chart(ax, labels, datasets, title)
         
-        # Generate a unique filename
-        filename = f"chart_{uuid.uuid4().hex[:8]}.png"
-        filepath = os.path.join(VISUALIZATION_DIR, filename)
+            # Generate a unique filename
+            filename = f"chart_{uuid.uuid4().hex[:8]}.png"
+            filepath = os.path.join(output_dir or VISUALIZATION_DIR, filename)
         
-        # Save the chart
-        plt.tight_layout()
-        plt.savefig(filepath, dpi=300, bbox_inches='tight')
-        plt.close()
+            # Save the chart
+            plt.tight_layout()
+            plt.savefig(filepath, dpi=dpi, bbox_inches='tight')
+            plt.close()
         
         return filepath
     except Exception as e:
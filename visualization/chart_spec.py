@@ -0,0 +1,349 @@
+"""
+Tolerant parsing, validation and local repair of LLM-generated chart specifications.
+
+``parse_tolerant_json`` reads a model response in a single pass and copes with
+prose around the JSON, code fences, ``//`` and ``/* */`` comments, trailing or
+missing commas, single quotes, Python literals and output that was cut off.
+``normalize_chart_spec`` then checks the result against the two structures
+``render_chart`` accepts (Chart.js style with a ``data`` object, or top-level
+``labels``/``datasets``) and repairs what it can, so a malformed response only
+costs another LLM call when nothing chartable can be salvaged.
+"""
+import json
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+CHART_TYPES = ("bar", "pie", "line")
+# Colors given to datasets that have none (the same palette as the fallback spec)
+DEFAULT_COLORS = ["#36a2eb", "#ff6384", "#4bc0c0", "#ffcd56", "#9966ff"]
+
+# Outcome and repair counters for the session, see record_chart_spec_outcome
+CHART_SPEC_STATS: Counter = Counter()
+
+_LITERALS = {
+    "true": "true", "false": "false", "null": "null",
+    "True": "true", "False": "false", "None": "null",
+    "NaN": "null", "Infinity": "null", "-Infinity": "null", "undefined": "null",
+}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _read_string(text: str, i: int) -> Tuple[str, int, bool]:
+    """Read a quoted string starting at ``text[i]``; returns (JSON literal, next index, terminated)."""
+    quote = text[i]
+    chars = []
+    i += 1
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\" and i + 1 < len(text):
+            escaped = text[i + 1]
+            # \' is only an escape inside single-quoted strings
+            chars.append(escaped if escaped == "'" else ch + escaped)
+            i += 2
+            continue
+        if ch == quote:
+            return '"' + "".join(chars) + '"', i + 1, True
+        if ch == '"':
+            chars.append('\\"')
+        elif ch == "\n":
+            chars.append("\\n")
+        else:
+            chars.append(ch)
+        i += 1
+    return '"' + "".join(chars) + '"', i, False
+
+
+def parse_tolerant_json(text: str) -> Tuple[Any, List[str]]:
+    """
+    Parse the first JSON object in ``text`` in a single pass, fixing common LLM
+    mistakes on the way. Returns (value, names of the repairs applied).
+    Code fences and prose around the object are skipped without counting as
+    repairs, since the prompt's own examples are fenced.
+    Raises ValueError if there is no object to parse.
+    """
+    repairs: List[str] = []
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in the response")
+
+    out: List[str] = []
+    # One entry per open container: its opening bracket and what comes next
+    # ("key", "colon", "value" or "comma")
+    stack: List[List[str]] = []
+    # (output length, closers) after the last complete member, for cutting off truncated output
+    safe_point: Tuple[int, str] = (0, "")
+    pending_comma = False
+    i = start
+    n = len(text)
+
+    def closers() -> str:
+        return "".join(_CLOSERS[frame[0]] for frame in reversed(stack))
+
+    def begin_member() -> None:
+        nonlocal pending_comma
+        frame = stack[-1]
+        if frame[1] == "comma":
+            if not pending_comma:
+                repairs.append("missing comma")
+            out.append(",")
+            frame[1] = "key" if frame[0] == "{" else "value"
+        elif frame[1] == "colon":
+            repairs.append("missing colon")
+            out.append(":")
+            frame[1] = "value"
+        pending_comma = False
+
+    def end_value() -> None:
+        nonlocal safe_point
+        if stack:
+            stack[-1][1] = "comma"
+            safe_point = (len(out), closers())
+
+    while i < n:
+        ch = text[i]
+        if ch.isspace():
+            i += 1
+        elif text.startswith("//", i):
+            repairs.append("comments")
+            newline = text.find("\n", i)
+            i = n if newline < 0 else newline + 1
+        elif text.startswith("/*", i):
+            repairs.append("comments")
+            close = text.find("*/", i + 2)
+            i = n if close < 0 else close + 2
+        elif ch in "{[":
+            if stack:
+                begin_member()
+            out.append(ch)
+            stack.append([ch, "key" if ch == "{" else "value"])
+            safe_point = (len(out), closers())
+            i += 1
+        elif ch in "}]":
+            if pending_comma:
+                repairs.append("trailing comma")
+                pending_comma = False
+            if stack[-1][0] == "{" and stack[-1][1] in ("colon", "value"):
+                # "key" or "key": with no value; drop the dangling member
+                repairs.append("missing value")
+                out[:] = out[:safe_point[0]]
+            # A mismatched closer still closes the innermost container
+            out.append(_CLOSERS[stack.pop()[0]])
+            end_value()
+            i += 1
+            if not stack:
+                break
+        elif ch == ",":
+            if pending_comma:
+                repairs.append("extra comma")
+            pending_comma = stack[-1][1] == "comma"
+            i += 1
+        elif ch == ":":
+            if stack[-1][1] == "colon":
+                out.append(":")
+                stack[-1][1] = "value"
+            i += 1
+        elif ch in "\"'":
+            if ch == "'":
+                repairs.append("single quotes")
+            literal, i, terminated = _read_string(text, i)
+            if not terminated:
+                break
+            frame = stack[-1]
+            begin_member()
+            out.append(literal)
+            if frame[1] == "key":
+                frame[1] = "colon"
+            else:
+                end_value()
+        else:
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "+-._$"):
+                j += 1
+            if j == i:
+                # Stray character such as a closing fence; skip it
+                i += 1
+                continue
+            token = text[i:j]
+            frame = stack[-1]
+            if frame[0] == "{" and frame[1] in ("key", "comma"):
+                begin_member()
+                repairs.append("unquoted key")
+                out.append(json.dumps(token))
+                frame[1] = "colon"
+            elif j == n:
+                # A number or literal at the very end may itself be cut off
+                break
+            else:
+                begin_member()
+                if token in _LITERALS:
+                    if token != _LITERALS[token]:
+                        repairs.append("non-JSON literal")
+                    out.append(_LITERALS[token])
+                else:
+                    try:
+                        float(token)
+                    except ValueError:
+                        repairs.append("unquoted string")
+                        token = json.dumps(token)
+                    out.append(token)
+                end_value()
+            i = j
+
+    if stack:
+        repairs.append("truncated")
+        out[:] = out[:safe_point[0]]
+        out.append(safe_point[1])
+    try:
+        value = json.loads("".join(out))
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Unrecoverable JSON: {exc}") from exc
+    return value, list(dict.fromkeys(repairs))
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value.replace(",", "").replace("$", "").strip())
+        except ValueError:
+            return None
+        return int(number) if number.is_integer() else number
+    return None
+
+
+def normalize_chart_spec(spec: Any, chart_type: Optional[str] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Validate a chart spec against the structures ``render_chart`` accepts and
+    repair it where possible. ``chart_type`` is used when the spec names none.
+    Returns (spec, repairs); raises ValueError if nothing chartable is left.
+    """
+    repairs: List[str] = []
+    if isinstance(spec, list) and spec and isinstance(spec[0], dict):
+        repairs.append("unwrapped list")
+        spec = spec[0]
+    if not isinstance(spec, dict):
+        raise ValueError("Chart spec is not a JSON object")
+    spec = dict(spec)
+
+    spec_type = spec.get("type")
+    if not isinstance(spec_type, str) or not spec_type.strip():
+        repairs.append("missing type")
+        spec["type"] = chart_type if chart_type in CHART_TYPES else "bar"
+    elif spec_type != spec_type.strip().lower():
+        spec["type"] = spec_type.strip().lower()
+
+    chart_js = isinstance(spec.get("data"), dict)
+    container = dict(spec["data"]) if chart_js else spec
+    datasets = container.get("datasets")
+    if isinstance(datasets, dict):
+        repairs.append("wrapped dataset")
+        datasets = [datasets]
+    if not isinstance(datasets, list):
+        if isinstance(container.get("data"), list) and not chart_js:
+            # {"labels": [...], "data": [...]} with no datasets
+            repairs.append("missing datasets")
+            datasets = [{"label": spec.get("title", "Value"), "data": spec.pop("data")}]
+        else:
+            raise ValueError("Chart spec has no datasets")
+
+    cleaned: List[Dict[str, Any]] = []
+    for index, dataset in enumerate(datasets):
+        if isinstance(dataset, list):
+            dataset = {"data": dataset}
+        if not isinstance(dataset, dict) or not isinstance(dataset.get("data"), list):
+            repairs.append("invalid dataset")
+            continue
+        values = [_number(value) for value in dataset["data"]]
+        if all(value is None for value in values):
+            repairs.append("invalid dataset")
+            continue
+        values = [0 if value is None else value for value in values]
+        if values != dataset["data"]:
+            repairs.append("non-numeric values")
+            dataset = {**dataset, "data": values}
+        if not isinstance(dataset.get("label", ""), str):
+            dataset = {**dataset, "label": str(dataset["label"])}
+        dataset.setdefault("label", f"Dataset {index + 1}")
+        cleaned.append(dataset)
+    if not cleaned:
+        raise ValueError("Chart spec has no numeric data")
+
+    longest = max(len(dataset["data"]) for dataset in cleaned)
+    labels = container.get("labels")
+    if not isinstance(labels, list) or not labels:
+        repairs.append("missing labels")
+        labels = [str(position + 1) for position in range(longest)]
+    labels = [str(label) for label in labels]
+    # A truncated response leaves lists of different lengths; keep the aligned prefix
+    length = min([len(labels)] + [len(dataset["data"]) for dataset in cleaned])
+    if length != len(labels) or any(len(dataset["data"]) != length for dataset in cleaned):
+        repairs.append("length mismatch")
+        labels = labels[:length]
+        cleaned = [{**dataset, "data": dataset["data"][:length]} for dataset in cleaned]
+    for dataset in cleaned:
+        if spec["type"] in ("bar", "pie") and "backgroundColor" not in dataset:
+            dataset["backgroundColor"] = DEFAULT_COLORS
+        if spec["type"] == "line" and "borderColor" not in dataset:
+            dataset["borderColor"] = DEFAULT_COLORS[len(cleaned) % len(DEFAULT_COLORS)]
+
+    container["labels"], container["datasets"] = labels, cleaned
+    if chart_js:
+        spec["data"] = container
+        options = spec.get("options")
+        if not isinstance(options, dict):
+            options = {}
+        # render_chart reads options.title.text for the Chart.js structure
+        title = options.get("title")
+        if not isinstance(title, dict) or not isinstance(title.get("text", ""), (str, dict)):
+            if isinstance(title, str):
+                repairs.append("string title")
+            elif title is not None:
+                repairs.append("invalid title")
+            plugins = options.get("plugins")
+            # Chart.js 3+ puts the title under plugins, as {"text": ...} or (loosely) a plain string
+            plugin_title = plugins.get("title") if isinstance(plugins, dict) else None
+            if isinstance(plugin_title, dict):
+                plugin_title = plugin_title.get("text")
+            text = title if isinstance(title, str) else spec.get("title") or plugin_title
+            options = {**options, "title": {"text": str(text or "Chart")}}
+        spec["options"] = options
+    elif not isinstance(spec.get("title", ""), str):
+        spec["title"] = str(spec["title"])
+    return spec, repairs
+
+
+def parse_chart_spec(text: str, chart_type: Optional[str] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Parse and normalize a chart spec from a raw LLM response; raises ValueError if unsalvageable."""
+    value, repairs = parse_tolerant_json(text)
+    spec, spec_repairs = normalize_chart_spec(value, chart_type)
+    return spec, repairs + spec_repairs
+
+
+def record_chart_spec_outcome(outcome: str, repairs: Optional[List[str]] = None, stats: Optional[Counter] = None) -> None:
+    """
+    Count a chart spec outcome: "clean", "repaired" (locally), "retried" (after
+    an extra LLM call) or "fallback" (built from the data), or an "extra_llm_call".
+    Counts go to ``stats`` if given, otherwise to the session's CHART_SPEC_STATS.
+    """
+    stats = CHART_SPEC_STATS if stats is None else stats
+    stats[outcome] += 1
+    for repair in repairs or []:
+        stats[f"repair:{repair}"] += 1
+
+
+def format_chart_spec_stats() -> str:
+    stats = CHART_SPEC_STATS
+    generated = stats["clean"] + stats["repaired"] + stats["retried"] + stats["fallback"]
+    repairs = ", ".join(
+        f"{name[len('repair:'):]} {count}" for name, count in stats.most_common() if name.startswith("repair:")
+    )
+    return (
+        f"Chart specs: {generated} generated; {stats['clean']} parsed as-is, "
+        f"{stats['repaired']} repaired locally, {stats['retried']} after a retry, "
+        f"{stats['fallback']} built from the data; {stats['extra_llm_call']} extra LLM calls"
+        + (f" (local repairs: {repairs})" if repairs else "")
+        + "."
+    )